@@ -0,0 +1,226 @@
+"""
+End-to-end benchmarks for the replay service against the offline fakes.
+
+Each scenario runs a number of concurrent viewers against the Flask app and
+reports throughput and p50/p99 latency. Results can be saved as a named
+baseline and later runs compared against it.
+
+Usage:
+    python functions/benchmarks/bench.py
+    python functions/benchmarks/bench.py --scenario predict_win --viewers 16
+    python functions/benchmarks/bench.py --save-baseline default
+    python functions/benchmarks/bench.py --compare default
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import fakes
+import harness
+from fixtures import MATCHUPS
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Metrics where a larger value is a regression; throughput regresses when it drops.
+LATENCY_METRICS = ("p50_ms", "p99_ms", "ttfb_p50_ms", "ttfb_p99_ms")
+
+# gid -> Stats API gamePk for every fixture game.
+GAME_PKS = {f"{hometeam}{date}0": game_pk for date, _, hometeam, game_pk in MATCHUPS}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values`."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+def _stream(client, method, url, **kwargs):
+    """Issue a request and drain the body, returning (status, body, ttfb_ms)."""
+    start = time.perf_counter()
+    response = getattr(client, method)(url, buffered=False, **kwargs)
+    ttfb = None
+    chunks = []
+    try:
+        for chunk in response.response:
+            if ttfb is None:
+                ttfb = (time.perf_counter() - start) * 1000
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    finally:
+        response.close()
+    if ttfb is None:
+        ttfb = (time.perf_counter() - start) * 1000
+    return response.status_code, b"".join(chunks), ttfb
+
+def game_replay(client, harness_, viewer, iteration):
+    gids = sorted(harness_.bigquery.games)
+    gid = gids[(viewer + iteration) % len(gids)]
+    status, body, ttfb = _stream(client, "post", "/game-replay", json={
+        "gid": gid,
+        "mode": "casual" if viewer % 2 else "technical",
+        "user_id": f"bench-viewer-{viewer}-{iteration}",
+        "interval": 0,
+    })
+    failed = status >= 400 or b"data: Error" in body or b"Replay complete" not in body
+    return failed, ttfb
+
+def predict_win(client, harness_, viewer, iteration):
+    gids = sorted(harness_.bigquery.games)
+    gid = gids[(viewer + iteration) % len(gids)]
+    status, body, ttfb = _stream(client, "get", f"/predict-win?gid={gid}&game_pk={GAME_PKS[gid]}")
+    failed = status >= 400 or not json.loads(body).get("predictions")
+    return failed, ttfb
+
+def games(client, harness_, viewer, iteration):
+    status, body, ttfb = _stream(client, "get", "/games?game_type=regular")
+    failed = status >= 400 or not json.loads(body)
+    return failed, ttfb
+
+SCENARIOS = {
+    "game_replay": game_replay,
+    "predict_win": predict_win,
+    "games": games,
+}
+
+def run_scenario(harness_, name, viewers, requests_per_viewer):
+    """Run one scenario with `viewers` concurrent clients and summarize it."""
+    scenario = SCENARIOS[name]
+    latencies = []
+    ttfbs = []
+    errors = 0
+    lock = threading.Lock()
+    writes_before = harness_.firestore.writes
+
+    def viewer_loop(viewer):
+        nonlocal errors
+        client = harness_.app.test_client()
+        for iteration in range(requests_per_viewer):
+            start = time.perf_counter()
+            try:
+                failed, ttfb = scenario(client, harness_, viewer, iteration)
+            except Exception:
+                failed, ttfb = True, None
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if ttfb is not None:
+                    ttfbs.append(ttfb)
+                errors += 1 if failed else 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=viewers) as pool:
+        list(pool.map(viewer_loop, range(viewers)))
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "ttfb_p50_ms": round(percentile(ttfbs, 50), 1),
+        "ttfb_p99_ms": round(percentile(ttfbs, 99), 1),
+        "firestore_writes": harness_.firestore.writes - writes_before,
+    }
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results against a baseline.
+
+    Returns:
+        list: One message per metric that regressed by more than `tolerance`.
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        for metric in LATENCY_METRICS:
+            if base.get(metric) and metrics[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{scenario}.{metric}: {base[metric]} -> {metrics[metric]}")
+        if base.get("throughput_rps") and metrics["throughput_rps"] < base["throughput_rps"] / (1 + tolerance):
+            regressions.append(f"{scenario}.throughput_rps: {base['throughput_rps']} -> {metrics['throughput_rps']}")
+    return regressions
+
+def print_table(results, baseline=None):
+    header = f"{'scenario':<14}{'reqs':>6}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p99 ms':>10}{'ttfb p50':>10}{'writes':>8}"
+    print(header)
+    print("-" * len(header))
+    for scenario, m in results.items():
+        print(f"{scenario:<14}{m['requests']:>6}{m['errors']:>6}{m['throughput_rps']:>9}{m['p50_ms']:>10}"
+              f"{m['p99_ms']:>10}{m['ttfb_p50_ms']:>10}{m['firestore_writes']:>8}")
+        if baseline and scenario in baseline:
+            b = baseline[scenario]
+            print(f"{'  baseline':<14}{b['requests']:>6}{b['errors']:>6}{b['throughput_rps']:>9}{b['p50_ms']:>10}"
+                  f"{b['p99_ms']:>10}{b['ttfb_p50_ms']:>10}{b.get('firestore_writes', 0):>8}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run; repeat for several. Defaults to all.")
+    parser.add_argument("--viewers", type=int, default=8, help="Concurrent viewers per scenario.")
+    parser.add_argument("--requests", type=int, default=2, help="Requests issued by each viewer.")
+    parser.add_argument("--latency-scale", type=float, default=0.1,
+                        help="Multiplier applied to the default backend latencies.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of backend calls that fail.")
+    parser.add_argument("--pregenerate", action="store_true",
+                        help="Fill the narration warehouse through /pregenerate before the scenarios run.")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save the results as baselines/NAME.json.")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against baselines/NAME.json.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression before --compare fails.")
+    args = parser.parse_args(argv)
+
+    config = {
+        "viewers": args.viewers,
+        "requests": args.requests,
+        "latency_scale": args.latency_scale,
+        "error_rate": args.error_rate,
+    }
+    if args.pregenerate:
+        config["pregenerate"] = True
+    backends = fakes.make_backends(latency_scale=args.latency_scale, error_rate=args.error_rate)
+    harness_ = harness.load_replay(backends)
+
+    # One untimed request so lazily imported client libraries are not charged to the first scenario.
+    harness_.app.test_client().get("/games?game_type=regular")
+    if args.pregenerate:
+        response = harness_.app.test_client().post(
+            "/pregenerate", headers={"Authorization": f"Bearer {os.environ['ADMIN_TOKEN']}"})
+        print(f"Pre-generated: {response.get_json()}")
+
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        results[name] = run_scenario(harness_, name, args.viewers, args.requests)
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            saved = json.load(f)
+        if saved["config"] != config:
+            print(f"Warning: baseline {args.compare} was recorded with {saved['config']}, running with {config}")
+        baseline = saved["results"]
+
+    print_table(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(os.path.join(BASELINE_DIR, f"{args.save_baseline}.json"), "w") as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+            f.write("\n")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
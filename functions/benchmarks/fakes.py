@@ -0,0 +1,347 @@
+"""
+In-process stand-ins for every cloud dependency of the replay services.
+
+Each fake sleeps for a configurable latency and can fail a configurable share of
+calls, so benchmarks can model slow or flaky backends without network access.
+"""
+import csv
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+import types
+import pandas as pd
+from google.protobuf.json_format import MessageToDict
+from fixtures import DATA_DIR, GAMES_DIR, STATSAPI_DIR
+
+
+class FakeBackendError(Exception):
+    """Raised by a fake when error injection triggers."""
+
+
+class Backend:
+    """
+    Latency and error profile for one fake backend.
+
+    Args:
+        latency_ms (float): Mean latency added to every call.
+        jitter_ms (float): Maximum uniform jitter added on top of the mean.
+        error_rate (float): Share of calls, between 0 and 1, that raise.
+        error_message (str): Message of the injected exception.
+    """
+    _rng = random.Random(0)
+    _rng_lock = threading.Lock()
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_message="injected failure"):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_message = error_message
+        self.calls = 0
+
+    def call(self):
+        with self._rng_lock:
+            self.calls += 1
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+            fail = self.error_rate and self._rng.random() < self.error_rate
+        delay = self.latency_ms + jitter
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if fail:
+            raise FakeBackendError(self.error_message)
+
+
+# Default profiles, roughly matching what the services see in production.
+DEFAULT_PROFILES = {
+    "bigquery": {"latency_ms": 400, "jitter_ms": 200},
+    "firestore": {"latency_ms": 20, "jitter_ms": 10},
+    "vertex": {"latency_ms": 80, "jitter_ms": 40},
+    "gemini": {"latency_ms": 900, "jitter_ms": 600, "error_message": "429 Resource exhausted"},
+    "statsapi": {"latency_ms": 150, "jitter_ms": 100},
+}
+
+def make_backends(latency_scale=1.0, error_rate=0.0, overrides=None):
+    """Build the Backend for every dependency, scaling the default latencies."""
+    backends = {}
+    for name, profile in DEFAULT_PROFILES.items():
+        profile = {**profile, **(overrides or {}).get(name, {})}
+        backends[name] = Backend(
+            latency_ms=profile["latency_ms"] * latency_scale,
+            jitter_ms=profile["jitter_ms"] * latency_scale,
+            error_rate=profile.get("error_rate", error_rate),
+            error_message=profile.get("error_message", "injected failure"),
+        )
+    return backends
+
+
+def load_fixture_games():
+    """Load every fixture game as a DataFrame, keyed by gid."""
+    games = {}
+    for path in sorted(glob.glob(os.path.join(GAMES_DIR, "*.csv"))):
+        plays = pd.read_csv(path, keep_default_na=False)
+        games[plays["gid"].iloc[0]] = plays
+    return games
+
+def load_player_names():
+    """Load id -> (first, last) for every player in data/players-2023-24.csv."""
+    names = {}
+    with open(os.path.join(DATA_DIR, "players-2023-24.csv"), newline="") as f:
+        for row in csv.DictReader(f):
+            names[row["id"]] = (row["first"], row["last"])
+    return names
+
+
+class _RowIterator:
+    def __init__(self, rows, columns):
+        self._rows = rows
+        self._columns = columns
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    @property
+    def total_rows(self):
+        return len(self._rows)
+
+    def to_dataframe(self):
+        return pd.DataFrame(self._rows, columns=self._columns)
+
+
+class _QueryJob:
+    def __init__(self, rows, columns, total_bytes):
+        self._result = _RowIterator(rows, columns)
+        self.total_bytes_processed = total_bytes
+        self.total_bytes_billed = total_bytes
+        self.cache_hit = False
+
+    def result(self, timeout=None):
+        return self._result
+
+
+class FakeBigQueryClient:
+    """Answers the plays, player-name and recent-games queries from fixtures."""
+
+    def __init__(self, backend, games, player_names):
+        self.backend = backend
+        self.games = games
+        self.player_names = player_names
+
+    def query(self, sql, job_config=None, **kwargs):
+        params = {p.name: getattr(p, "values", getattr(p, "value", None))
+                  for p in getattr(job_config, "query_parameters", None) or []}
+        if job_config is not None and job_config.dry_run:
+            return _QueryJob([], [], 1024)
+        self.backend.call()
+
+        if "@gid" in sql:
+            plays = self.games.get(params["gid"])
+            if plays is None:
+                return _QueryJob([], [], 0)
+            return _QueryJob(plays.to_dict("records"), list(plays.columns), int(plays.memory_usage().sum()))
+        if "@ids" in sql:
+            rows = [{"id": pid, "first": self.player_names[pid][0], "last": self.player_names[pid][1]}
+                    for pid in params["ids"] if pid in self.player_names]
+            return _QueryJob(rows, ["id", "first", "last"], 64 * len(rows))
+        if "@game_type" in sql:
+            rows = []
+            for gid, plays in sorted(self.games.items(), key=lambda item: -int(item[1]["date"].iloc[0])):
+                first = plays.iloc[0]
+                rows.append({"gid": gid, "visteam": first["visteam"], "hometeam": first["hometeam"], "date": int(first["date"])})
+            return _QueryJob(rows[:15], ["gid", "visteam", "hometeam", "date"], 4096)
+        raise FakeBackendError(f"Unrecognized query: {sql}")
+
+    def query_and_wait(self, query, job_config=None, **kwargs):
+        return self.query(query, job_config=job_config).result()
+
+
+class _Snapshot:
+    def __init__(self, data):
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    def get(self, field_paths=None, **kwargs):
+        self._client.backend.call()
+        with self._client.lock:
+            data = self._client.documents.get(self._path)
+            if data is not None and field_paths:
+                data = {k: v for k, v in data.items() if k in field_paths}
+            return _Snapshot(dict(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self._client.backend.call()
+        with self._client.lock:
+            self._apply_set(data, merge)
+
+    def _apply_set(self, data, merge):
+        self._client.writes += 1
+        if merge and self._path in self._client.documents:
+            self._client.documents[self._path].update(data)
+        else:
+            self._client.documents[self._path] = dict(data)
+
+    def update(self, data):
+        self._client.backend.call()
+        with self._client.lock:
+            self._client.writes += 1
+            if self._path not in self._client.documents:
+                raise FakeBackendError(f"No document to update: {'/'.join(self._path)}")
+            self._client.documents[self._path].update(data)
+
+    def delete(self):
+        self._client.backend.call()
+        with self._client.lock:
+            self._apply_delete()
+
+    def _apply_delete(self):
+        self._client.writes += 1
+        self._client.documents.pop(self._path, None)
+
+
+class _WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._operations = []
+
+    def set(self, reference, data, merge=False):
+        self._operations.append(lambda: reference._apply_set(data, merge))
+
+    def delete(self, reference):
+        self._operations.append(reference._apply_delete)
+
+    def commit(self):
+        self._client.backend.call()
+        with self._client.lock:
+            for operation in self._operations:
+                operation()
+
+
+class _CollectionReference:
+    def __init__(self, client, name):
+        self._client = client
+        self._name = name
+
+    def document(self, document_id):
+        return _DocumentReference(self._client, (self._name, document_id))
+
+
+class FakeFirestoreClient:
+    """Dictionary-backed Firestore with per-call latency and a write counter."""
+
+    def __init__(self, backend, database=None):
+        self.backend = backend
+        self.documents = {}
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def collection(self, name):
+        return _CollectionReference(self, name)
+
+    def batch(self):
+        return _WriteBatch(self)
+
+
+class FakePredictionServiceClient:
+    """
+    Vertex AI prediction stand-in. Win endpoints return a probability driven
+    by the score difference, pitch endpoints return a pitch label.
+    """
+
+    def __init__(self, backend, pitch_endpoint_id):
+        self.backend = backend
+        self.pitch_endpoint_id = pitch_endpoint_id
+
+    def endpoint_path(self, project, location, endpoint):
+        return f"projects/{project}/locations/{location}/endpoints/{endpoint}"
+
+    def predict(self, endpoint, instances, parameters=None, timeout=None, **kwargs):
+        self.backend.call()
+        instance = MessageToDict(instances[0])
+        if endpoint.endswith(f"/{self.pitch_endpoint_id}"):
+            count = instance.get("count", "00")
+            count = f"{int(count):02d}" if isinstance(count, float) else str(count)
+            label = "FF" if count[-1] == "2" else "SL"
+            prediction = {"predicted_label": label, "value": 0.0}
+        else:
+            diff = float(instance.get("home_team_runs", 0)) - float(instance.get("away_team_runs", 0))
+            prediction = {"value": max(1.0, min(99.0, 50.0 + 9.0 * diff))}
+        return types.SimpleNamespace(predictions=[prediction])
+
+
+class FakeGenerativeModel:
+    """
+    Gemini stand-in that answers every prompt with a short canned description,
+    or with a JSON array of them for batch narration prompts.
+    """
+
+    backend = Backend()
+    _batch = re.compile(r"JSON array of exactly (\d+) strings")
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, safety_settings=None, **kwargs):
+        self.backend.call()
+        words = len(str(prompt).split())
+        batch = self._batch.search(str(prompt))
+        if batch:
+            count = int(batch.group(1))
+            descriptions = [f"Play {n}: a well-placed pitch sets up the out." for n in range(1, count + 1)]
+            return types.SimpleNamespace(text="```json\n" + json.dumps(descriptions) + "\n```")
+        return types.SimpleNamespace(text=f"A well-placed pitch sets up the out ({words} prompt words).")
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code} error")
+
+    def json(self):
+        return self._payload
+
+
+class FakeStatsApi:
+    """Serves recorded schedule and live feed responses in place of requests.get."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.responses = {}
+        for path in glob.glob(os.path.join(STATSAPI_DIR, "*.json")):
+            with open(path) as f:
+                self.responses[os.path.basename(path)[:-5]] = json.load(f)
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        import requests
+        try:
+            self.backend.call()
+        except FakeBackendError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        if "/feed/live" in url:
+            game_pk = url.split("/game/")[1].split("/")[0]
+            payload = self.responses.get(f"feed_{game_pk}")
+        else:
+            date = url.split("date=")[1].split("&")[0].replace("-", "")
+            payload = self.responses.get(f"schedule_{date}", {"totalGames": 0, "dates": []})
+        if payload is None:
+            return FakeResponse({}, status_code=404)
+        return FakeResponse(payload)
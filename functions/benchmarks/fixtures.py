@@ -0,0 +1,292 @@
+"""
+Build fixture games for the offline benchmarks from the players roster in data/.
+
+Games are simulated with a seeded RNG so the output is stable across runs. Each
+game is written as a Retrosheet-style plays CSV together with the Stats API
+schedule and live feed responses that match it, so the replay service can be
+exercised end to end without touching BigQuery or the Stats API.
+
+Usage:
+    python functions/benchmarks/fixtures.py
+"""
+import csv
+import json
+import os
+import random
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, "..", "..", "data")
+FIXTURE_DIR = os.path.join(ROOT, "fixtures")
+GAMES_DIR = os.path.join(FIXTURE_DIR, "games")
+STATSAPI_DIR = os.path.join(FIXTURE_DIR, "statsapi")
+
+SEED = 2024
+
+# (date, visiting team, home team, Stats API gamePk) for every fixture game.
+MATCHUPS = [
+    ("20240928", "NYA", "PIT", 745015),
+    ("20240928", "BOS", "TOR", 744936),
+    ("20240927", "LAN", "COL", 745162),
+    ("20240927", "ATL", "NYN", 745003),
+    ("20240926", "SEA", "OAK", 745081),
+    ("20240926", "CHN", "CIN", 744991),
+]
+
+TEAM_IDS = {
+    "ATL": 144, "BOS": 111, "CHN": 112, "CIN": 113, "COL": 115, "LAN": 119,
+    "NYA": 147, "NYN": 121, "OAK": 133, "PIT": 134, "SEA": 136, "TOR": 141,
+}
+
+# Outcome code -> (weight, event, fielder, stat columns)
+OUTCOMES = {
+    "strikeout": (22, "K", 2, {"k": 1, "ab": 1}),
+    "groundout": (20, "63/G6", 3, {"ab": 1, "bip": 1}),
+    "flyout": (18, "8/F8", 8, {"ab": 1, "bip": 1}),
+    "lineout": (6, "6/L6", 6, {"ab": 1, "bip": 1}),
+    "single": (14, "S7/L7", None, {"ab": 1, "bip": 1, "single": 1}),
+    "double": (5, "D8/L89", None, {"ab": 1, "bip": 1, "double": 1}),
+    "triple": (1, "T9/F9LD", None, {"ab": 1, "bip": 1, "triple": 1}),
+    "homerun": (3, "HR/F7", None, {"ab": 1, "bip": 1, "hr": 1}),
+    "walk": (8, "W", None, {"walk": 1}),
+    "error": (2, "E6/G6", None, {"ab": 1, "bip": 1, "e6": 1}),
+    "double_play": (3, "64(1)3/GDP/G6", 3, {"ab": 1, "bip": 1, "gdp": 1, "a6": 1, "a4": 1, "po4": 1}),
+}
+
+PITCH_SEQUENCES = ["BCFX", "CSS", "BBCX", "FBX", "BBBB", "CX", "SFBFX", "BCBFS", "X", "BSX"]
+
+STAT_COLUMNS = (
+    ["pa", "ab", "single", "double", "triple", "hr", "walk", "k", "rbi", "er", "wp", "lp",
+     "gdp", "tp", "bip", "runs", "nump", "pitch_num_in_pa"]
+    + [f"po{i}" for i in range(10)]
+    + [f"a{i}" for i in range(1, 10)]
+    + [f"e{i}" for i in range(1, 10)]
+)
+
+COLUMNS = [
+    "gid", "date", "gametype", "visteam", "hometeam", "ballpark", "inning", "top_bot", "vis_home",
+    "batteam", "pitteam", "batter_team", "pitcher_team", "batter", "pitcher", "bathand", "pithand",
+    "event", "pitches", "count", "outs_pre", "outs_post", "br1_pre", "br2_pre", "br3_pre",
+    "br1_post", "br2_post", "br3_post", "run_b", "run1", "run2", "run3", "prun1", "prun2", "prun3",
+    "bat_f", "event_order", "ordered_event",
+] + [f"f{i}" for i in range(2, 10)] + STAT_COLUMNS
+
+
+def load_players(season="2024"):
+    """Load the roster for `season` from data/players-2023-24.csv, keyed by player id."""
+    players = {}
+    with open(os.path.join(DATA_DIR, "players-2023-24.csv"), newline="") as f:
+        for row in csv.DictReader(f):
+            if row["season"] == season:
+                players[row["id"]] = row
+    return players
+
+def build_lineup(players, team):
+    """Pick nine regulars, a starting pitcher and a bullpen for `team`."""
+    roster = [p for p in players.values() if p["team"] == team]
+    hitters = sorted((p for p in roster if int(p["g_p"]) == 0), key=lambda p: -int(p["g"]))[:9]
+    starters = sorted((p for p in roster if int(p["g_sp"]) > 0), key=lambda p: -int(p["g_sp"]))
+    relievers = sorted((p for p in roster if int(p["g_rp"]) > 0), key=lambda p: -int(p["g_rp"]))
+    fielders = {pos: p["id"] for pos, p in zip(range(2, 10), hitters)}
+    return {"hitters": hitters, "pitchers": starters[:1] + relievers[:3], "fielders": fielders}
+
+def _advance(bases, batter, count):
+    """Move every runner (and the batter, when count > 0) forward `count` bases."""
+    runs = 0
+    new_bases = [None, None, None]
+    for base in (2, 1, 0):
+        runner = bases[base]
+        if runner is None:
+            continue
+        target = base + count
+        if target >= 3:
+            runs += 1
+        else:
+            new_bases[target] = runner
+    if count >= 4:
+        runs += 1
+    elif count > 0:
+        new_bases[count - 1] = batter
+    return new_bases, runs
+
+def _force(bases, batter):
+    """Batter to first, forcing runners ahead only when they must move."""
+    runs = 0
+    new_bases = list(bases)
+    if new_bases[0] is not None:
+        if new_bases[1] is not None:
+            if new_bases[2] is not None:
+                runs += 1
+            new_bases[2] = new_bases[1]
+        new_bases[1] = new_bases[0]
+    new_bases[0] = batter
+    return new_bases, runs
+
+def simulate_game(players, date, visteam, hometeam, rng):
+    """Simulate one game and return its plays as a list of row dicts."""
+    gid = f"{hometeam}{date}0"
+    lineups = {visteam: build_lineup(players, visteam), hometeam: build_lineup(players, hometeam)}
+    batting_slot = {visteam: 0, hometeam: 0}
+    score = {visteam: 0, hometeam: 0}
+    weights = [o[0] for o in OUTCOMES.values()]
+    names = list(OUTCOMES)
+    plays = []
+    order = 0
+    inning = 1
+
+    while True:
+        for top_bot in (0, 1):
+            if inning >= 9 and top_bot == 1 and score[hometeam] > score[visteam]:
+                break
+            batteam, pitteam = (visteam, hometeam) if top_bot == 0 else (hometeam, visteam)
+            defense = lineups[pitteam]
+            pitcher = defense["pitchers"][min((inning - 1) // 3, len(defense["pitchers"]) - 1)]
+            outs = 0
+            bases = [None, None, None]
+            while outs < 3:
+                hitter = lineups[batteam]["hitters"][batting_slot[batteam] % 9]
+                batting_slot[batteam] += 1
+                outcome = rng.choices(names, weights)[0]
+                if outcome == "double_play" and (bases[0] is None or outs == 2):
+                    outcome = "groundout"
+                _, event, fielder, stats = OUTCOMES[outcome]
+
+                outs_pre = outs
+                bases_pre = list(bases)
+                runs = 0
+                if outcome in ("strikeout", "groundout", "flyout", "lineout"):
+                    outs += 1
+                elif outcome == "double_play":
+                    outs += 2
+                    bases[0] = None
+                elif outcome in ("walk", "error"):
+                    bases, runs = _force(bases, hitter["id"])
+                else:
+                    count = {"single": 1, "double": 2, "triple": 3, "homerun": 4}[outcome]
+                    bases, runs = _advance(bases, hitter["id"], count)
+                if outs >= 3:
+                    bases, runs = [None, None, None], 0
+
+                pitches = rng.choice(PITCH_SEQUENCES)
+                row = {column: 0 for column in STAT_COLUMNS}
+                row.update(stats)
+                if fielder is not None:
+                    row[f"po{fielder}"] = row.get(f"po{fielder}", 0) + 1
+                order += 1
+                score[batteam] += runs
+                row.update({
+                    "gid": gid,
+                    "date": date,
+                    "gametype": "regular",
+                    "visteam": visteam,
+                    "hometeam": hometeam,
+                    "ballpark": f"{hometeam}01",
+                    "inning": inning,
+                    "top_bot": top_bot,
+                    "vis_home": top_bot,
+                    "batteam": batteam,
+                    "pitteam": pitteam,
+                    "batter_team": batteam,
+                    "pitcher_team": pitteam,
+                    "batter": hitter["id"],
+                    "pitcher": pitcher["id"],
+                    "bathand": hitter["bat"],
+                    "pithand": pitcher["throw"],
+                    "event": event,
+                    "pitches": ",".join(pitches),
+                    "count": f"{pitches.count('B')}{min(pitches.count('C') + pitches.count('S'), 2)}",
+                    "outs_pre": outs_pre,
+                    "outs_post": min(outs, 3),
+                    "br1_pre": bases_pre[0] or "",
+                    "br2_pre": bases_pre[1] or "",
+                    "br3_pre": bases_pre[2] or "",
+                    "br1_post": bases[0] or "",
+                    "br2_post": bases[1] or "",
+                    "br3_post": bases[2] or "",
+                    "run_b": hitter["id"] if outcome == "homerun" else "",
+                    "run1": "", "run2": "", "run3": "",
+                    "prun1": "", "prun2": "", "prun3": "",
+                    "bat_f": 0,
+                    "event_order": order,
+                    "ordered_event": order,
+                    "pa": 1,
+                    "rbi": runs if outcome != "error" else 0,
+                    "er": runs if outcome != "error" else 0,
+                    "runs": runs,
+                    "nump": len(pitches),
+                    "pitch_num_in_pa": len(pitches),
+                })
+                row.update({f"f{pos}": player for pos, player in defense["fielders"].items()})
+                plays.append(row)
+
+        if inning >= 9 and score[visteam] != score[hometeam]:
+            break
+        if inning >= 12:
+            break
+        inning += 1
+
+    return plays
+
+def build_feed(plays, players, game_pk):
+    """Build a Stats API live feed with the fields the replay service reads."""
+    rng = random.Random(game_pk)
+    all_plays = []
+    for play in plays:
+        batter = players[play["batter"]]
+        pitcher = players[play["pitcher"]]
+        all_plays.append({
+            "about": {"inning": play["inning"], "isTopInning": play["top_bot"] == 0},
+            "matchup": {
+                "batter": {"fullName": f"{batter['first']} {batter['last']}"},
+                "pitcher": {"fullName": f"{pitcher['first']} {pitcher['last']}"},
+            },
+            "result": {"event": play["event"]},
+            "playId": "%08x-%04x-%04x-%04x-%012x" % (
+                rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16),
+                rng.getrandbits(16), rng.getrandbits(48),
+            ),
+        })
+    return {"gamePk": game_pk, "liveData": {"plays": {"allPlays": all_plays}}}
+
+def build_schedule(date, games):
+    """Build a Stats API schedule response for every fixture game on `date`."""
+    return {
+        "totalGames": len(games),
+        "dates": [{
+            "date": f"{date[:4]}-{date[4:6]}-{date[6:]}",
+            "games": [{
+                "gamePk": game_pk,
+                "teams": {
+                    "away": {"team": {"id": TEAM_IDS[visteam]}},
+                    "home": {"team": {"id": TEAM_IDS[hometeam]}},
+                },
+            } for visteam, hometeam, game_pk in games],
+        }],
+    }
+
+def write_fixtures():
+    """Regenerate every fixture file under benchmarks/fixtures."""
+    rng = random.Random(SEED)
+    players = load_players()
+    os.makedirs(GAMES_DIR, exist_ok=True)
+    os.makedirs(STATSAPI_DIR, exist_ok=True)
+
+    schedules = {}
+    for date, visteam, hometeam, game_pk in MATCHUPS:
+        plays = simulate_game(players, date, visteam, hometeam, rng)
+        gid = plays[0]["gid"]
+        with open(os.path.join(GAMES_DIR, f"{gid}.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(plays)
+        with open(os.path.join(STATSAPI_DIR, f"feed_{game_pk}.json"), "w") as f:
+            json.dump(build_feed(plays, players, game_pk), f, separators=(",", ":"))
+        schedules.setdefault(date, []).append((visteam, hometeam, game_pk))
+        print(f"Wrote {gid}: {len(plays)} plays")
+
+    for date, games in schedules.items():
+        with open(os.path.join(STATSAPI_DIR, f"schedule_{date}.json"), "w") as f:
+            json.dump(build_schedule(date, games), f, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    write_fixtures()
@@ -0,0 +1,93 @@
+"""Load the replay service with every cloud client replaced by a fake from fakes.py."""
+import importlib
+import os
+import sys
+from unittest import mock
+import fakes
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+REPLAY_DIR = os.path.join(ROOT, "..", "game-replay")
+# Holds the shared skyline_core package.
+FUNCTIONS_DIR = os.path.join(ROOT, "..")
+
+FAKE_ENV = {
+    "PROJECT_ID": "bench-project",
+    "PROJECT_NAME": "bench-project",
+    "DEFAULT_DATABASE": "(default)",
+    "ENDPOINT_ID": "gemini-pro",
+    "FLASH_ENDPOINT_ID": "gemini-flash",
+    "PITCH_PREDICTION_ENDPOINT_ID": "pitch",
+    "WIN_PREDICTION_ENDPOINT_ID": "win",
+    "BATTING_PREDICTION_ENDPOINT_ID": "batting",
+    "BIGQUERY_DATASET": "baseball_custom_dataset",
+    "BIGQUERY_TABLE": "plays",
+    # Scenarios measure live generation unless bench.py --pregenerate fills the warehouse first.
+    "NARRATION_PREGENERATE": "0",
+    "NARRATION_GEMINI_RATE": "0",
+    "ADMIN_TOKEN": "bench-admin-token",
+}
+
+
+class Harness:
+    """The imported replay module together with the fakes standing in for its clients."""
+
+    def __init__(self, replay, backends, bigquery, firestore, prediction, stats_api):
+        self.replay = replay
+        self.backends = backends
+        self.bigquery = bigquery
+        self.firestore = firestore
+        self.prediction = prediction
+        self.stats_api = stats_api
+
+    @property
+    def app(self):
+        return self.replay.app
+
+
+def install_fakes(backends):
+    """
+    Install fake clients in the replay client factories and patch requests.get
+    for the rest of the process.
+
+    Returns:
+        dict: The installed fakes, keyed by backend name.
+    """
+    for key, value in FAKE_ENV.items():
+        os.environ.setdefault(key, value)
+    for path in (FUNCTIONS_DIR, REPLAY_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    installed = {
+        "bigquery": fakes.FakeBigQueryClient(backends["bigquery"], fakes.load_fixture_games(), fakes.load_player_names()),
+        "firestore": fakes.FakeFirestoreClient(backends["firestore"]),
+        "prediction": fakes.FakePredictionServiceClient(backends["vertex"], os.environ["PITCH_PREDICTION_ENDPOINT_ID"]),
+        "stats_api": fakes.FakeStatsApi(backends["statsapi"]),
+    }
+    fakes.FakeGenerativeModel.backend = backends["gemini"]
+    mock.patch("requests.get", installed["stats_api"].get).start()
+
+    from skyline_core import clients
+    clients.reset()
+    clients.override("bigquery", installed["bigquery"])
+    clients.override("firestore", installed["firestore"])
+    clients.override("prediction", installed["prediction"])
+    clients.override("safety_settings", [])
+    for endpoint_id in (os.environ["ENDPOINT_ID"], os.environ["FLASH_ENDPOINT_ID"]):
+        clients.override(f"gemini:{endpoint_id}", fakes.FakeGenerativeModel(endpoint_id))
+    return installed
+
+def load_replay(backends):
+    """
+    Import replay.py with fake clients installed.
+
+    Returns:
+        Harness: The loaded service and its fakes.
+    """
+    installed = install_fakes(backends)
+    if "replay" in sys.modules:
+        replay = importlib.reload(sys.modules["replay"])
+    else:
+        replay = importlib.import_module("replay")
+    return Harness(replay, backends, installed["bigquery"], installed["firestore"],
+                   installed["prediction"], installed["stats_api"])
@@ -0,0 +1,134 @@
+"""
+Cold-start measurements for the replay service.
+
+Every run starts a fresh interpreter, imports replay.py and serves one request
+against the offline fakes. It reports the import time, the time to the first
+response, and which heavy client libraries that request had to load.
+
+Usage:
+    python functions/benchmarks/startup.py
+    python functions/benchmarks/startup.py --runs 10 --save-baseline startup
+    python functions/benchmarks/startup.py --compare startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASELINE_DIR = os.path.join(ROOT, "baselines")
+REPLAY_DIR = os.path.join(ROOT, "..", "game-replay")
+# Holds the shared skyline_core package.
+FUNCTIONS_DIR = os.path.join(ROOT, "..")
+
+HEAVY_MODULES = ("google.cloud.bigquery", "google.cloud.firestore", "google.cloud.aiplatform_v1", "vertexai", "pandas")
+
+# route -> (method, path, JSON body)
+ROUTES = {
+    "pause": ("post", "/pause", {"user_id": "startup", "gid": "PIT202409280", "mode": "casual", "interval": 1}),
+    "games": ("get", "/games?game_type=regular", None),
+}
+
+
+def child(route):
+    """
+    Measure one cold start in this process and print the result as JSON. The
+    parent passes the service environment, so nothing but replay.py is
+    imported before the import is timed.
+    """
+    sys.path[:0] = [REPLAY_DIR, FUNCTIONS_DIR]
+    start = time.perf_counter()
+    import replay
+    import_ms = (time.perf_counter() - start) * 1000
+    loaded_at_import = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    import fakes
+    import harness
+    harness.install_fakes(fakes.make_backends(latency_scale=0))
+    method, path, body = ROUTES[route]
+    client = replay.app.test_client()
+    loaded_before_request = set(sys.modules)
+    start = time.perf_counter()
+    response = getattr(client, method)(path, json=body) if body else getattr(client, method)(path)
+    first_response_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "status": response.status_code,
+        "import_ms": import_ms,
+        "first_response_ms": first_response_ms,
+        "loaded_at_import": loaded_at_import,
+        "loaded_by_request": [m for m in HEAVY_MODULES if m in sys.modules and m not in loaded_before_request],
+    }))
+
+def measure(route, runs):
+    import harness
+    env = {**harness.FAKE_ENV, **os.environ}
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", route],
+            check=True, capture_output=True, text=True, env=env,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "runs": runs,
+        "import_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+        "first_response_ms": round(statistics.median(s["first_response_ms"] for s in samples), 1),
+        "status": samples[-1]["status"],
+        "loaded_at_import": samples[-1]["loaded_at_import"],
+        "loaded_by_request": samples[-1]["loaded_by_request"],
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts measured per route; the median is reported.")
+    parser.add_argument("--save-baseline", metavar="NAME", help="Save the results as baselines/NAME.json.")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against baselines/NAME.json.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression before --compare fails.")
+    parser.add_argument("--child", choices=sorted(ROUTES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    results = {route: measure(route, args.runs) for route in ROUTES}
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = json.load(f)["results"]
+
+    for route, r in results.items():
+        line = f"{route:<8} import {r['import_ms']:>8.1f} ms  first response {r['first_response_ms']:>8.1f} ms"
+        if baseline and route in baseline:
+            b = baseline[route]
+            line += f"  (baseline {b['import_ms']:.1f} / {b['first_response_ms']:.1f} ms)"
+        print(line)
+        print(f"{'':<8} loaded at import: {', '.join(r['loaded_at_import']) or 'none'}; "
+              f"loaded by request: {', '.join(r['loaded_by_request']) or 'none'}")
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(os.path.join(BASELINE_DIR, f"{args.save_baseline}.json"), "w") as f:
+            json.dump({"config": {"runs": args.runs}, "results": results}, f, indent=2)
+            f.write("\n")
+
+    if baseline:
+        regressions = [
+            f"{route}.{metric}: {baseline[route][metric]} -> {r[metric]}"
+            for route, r in results.items() if route in baseline
+            for metric in ("import_ms", "first_response_ms")
+            if r[metric] > baseline[route][metric] * (1 + args.tolerance)
+        ]
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
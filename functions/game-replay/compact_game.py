@@ -0,0 +1,207 @@
+import collections
+import logging
+import os
+import sys
+import threading
+import numpy as np
+import game_state
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Memory the per-instance game cache may hold.
+CACHE_BYTES = int(float(os.environ.get("GAME_CACHE_MB", 256)) * 1024 * 1024)
+
+_INT_TYPES = (np.int8, np.int16, np.int32, np.int64)
+
+
+def _smallest_int(values):
+    if not len(values):
+        return values.astype(np.int8)
+    low, high = values.min(), values.max()
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return values.astype(dtype)
+    return values
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+def _encode(series):
+    """
+    Encode one column as (kind, values, categories, nulls): "int", "float" or
+    "bool" values, or for strings and other objects "dict" codes into
+    categories. nulls is None or (mask, null), where null is the value the
+    column held (pd.NA, NaN or None), so a decoded play prints the same
+    feature strings as the DataFrame row.
+    """
+    kind = series.dtype.kind
+    mask = series.isna().to_numpy()
+    nulls = (mask, series[mask].iloc[0]) if mask.any() else None
+    if kind == "b" and nulls is None:
+        return "bool", series.to_numpy(dtype=bool), None, None
+    if kind in "iu":
+        # Nullable Int64 columns keep their integers; nulls are decoded from the mask.
+        return "int", _smallest_int(series.to_numpy(dtype=np.int64, na_value=0)), None, nulls
+    if kind == "f":
+        values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        narrow = values.astype(np.float32)
+        # float32 only when it round-trips exactly, so decoded values print the same.
+        exact = np.array_equal(narrow.astype(np.float64), values, equal_nan=True)
+        return "float", narrow if exact else values, None, nulls
+    codes, categories = series.factorize()
+    return "dict", _smallest_int(codes), tuple(_intern(value) for value in categories), nulls
+
+
+class CompactGame:
+    """
+    The plays of one game from fetch_plays, stored column by column in the
+    smallest NumPy dtype that holds each column, with strings (teams, player
+    ids, event codes) dictionary-encoded. Iterate it, or index it by play
+    position, for Play views; `state` is its game_state.GameState.
+    """
+    __slots__ = ("gid", "columns", "state", "nbytes", "_columns", "_index")
+
+    def __init__(self, plays):
+        self.gid = plays["gid"].iloc[0] if len(plays) and "gid" in plays.columns else None
+        self.columns = tuple(plays.columns)
+        self.state = game_state.GameState(plays)
+        self._columns = {name: _encode(plays[name]) for name in self.columns}
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self.nbytes = self._measure()
+
+    def _measure(self):
+        size = sum(values.nbytes + (nulls[0].nbytes if nulls else 0) for _, values, _, nulls in self._columns.values())
+        size += sum(getattr(self.state, name).nbytes for name in game_state.GameState.__slots__
+                    if isinstance(getattr(self.state, name), np.ndarray))
+        # Category strings are interned and shared between games, so this overcounts.
+        size += sum(sys.getsizeof(value) for _, _, categories, _ in self._columns.values() if categories
+                    for value in categories)
+        return size
+
+    def __len__(self):
+        return self.state.count
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return Play(self, position)
+
+    def __iter__(self):
+        return (Play(self, position) for position in range(len(self)))
+
+    def iterrows(self):
+        """Yield (position, play) like DataFrame.iterrows on a fetch_plays result."""
+        return ((position, Play(self, position)) for position in range(len(self)))
+
+    def value(self, name, position):
+        """Decode the value of column `name` for the play at `position`."""
+        kind, values, categories, nulls = self._columns[name]
+        if nulls is not None and nulls[0][position]:
+            return nulls[1]
+        if kind == "dict":
+            return categories[values[position]]
+        return values[position].item()
+
+    def distinct(self, *names):
+        """Return the distinct non-null values of the given columns."""
+        values = set()
+        for name in names:
+            kind, column, categories, nulls = self._columns.get(name, (None, None, None, None))
+            if kind == "dict":
+                values.update(categories)
+            elif kind is not None:
+                present = column[~nulls[0]] if nulls is not None else column
+                values.update(value.item() for value in np.unique(present))
+        return values
+
+
+class Play:
+    """A view of one play of a CompactGame, read like a fetch_plays row."""
+    __slots__ = ("_game", "position")
+
+    def __init__(self, game, position):
+        self._game = game
+        self.position = position
+
+    def __getitem__(self, name):
+        return self._game.value(name, self.position)
+
+    @property
+    def state(self):
+        """The game_state.GameState of the play's game; index it with `position`."""
+        return self._game.state
+
+    def __getattr__(self, name):
+        # Private and dunder lookups (copy, pickle) happen before the slots are set.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self._game.value(name, self.position)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, name):
+        return name in self._game._index
+
+    def get(self, name, default=None):
+        return self._game.value(name, self.position) if name in self._game._index else default
+
+    def keys(self):
+        return self._game.columns
+
+    def items(self):
+        return ((name, self._game.value(name, self.position)) for name in self._game.columns)
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+class GameCache:
+    """Least-recently-used CompactGame cache holding at most `max_bytes`."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._games = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, gid):
+        with self._lock:
+            game = self._games.get(gid)
+            if game is not None:
+                self._games.move_to_end(gid)
+        instrumentation.increment("game_cache_lookups_total", result="hit" if game is not None else "miss")
+        return game
+
+    def put(self, gid, game):
+        if game.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._games.pop(gid, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._games[gid] = game
+            self.nbytes += game.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._games.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                instrumentation.increment("game_cache_evictions_total")
+            count, nbytes = len(self._games), self.nbytes
+        instrumentation.gauge("game_cache_games", count)
+        instrumentation.gauge("game_cache_bytes", nbytes)
+
+    def get_or_load(self, gid, load):
+        """Return the cached game `gid`, building it from the DataFrame `load(gid)` returns on a miss."""
+        game = self.get(gid)
+        if game is None:
+            game = CompactGame(load(gid))
+            if len(game):
+                self.put(gid, game)
+        return game
+
+    def __len__(self):
+        return len(self._games)
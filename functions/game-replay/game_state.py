@@ -0,0 +1,107 @@
+import numpy as np
+
+FIRST, SECOND, THIRD = 1, 2, 4
+
+# Text for each bases code (FIRST | SECOND | THIRD bit mask).
+BASE_LABELS = tuple(
+    ", ".join(label for bit, label in ((FIRST, "Runner on first"), (SECOND, "Runner on second"), (THIRD, "Runner on third"))
+              if code & bit) or "Bases empty"
+    for code in range(8)
+)
+
+# Average runs scored from each base-out state to the end of the inning
+# (MLB 2010-2015), indexed by the base-out code outs * 8 + bases.
+RUN_EXPECTANCY = np.array([
+    0.481, 0.859, 1.100, 1.437, 1.350, 1.784, 1.964, 2.292,
+    0.254, 0.509, 0.664, 0.884, 0.950, 1.130, 1.376, 1.541,
+    0.098, 0.214, 0.319, 0.429, 0.353, 0.478, 0.580, 0.752,
+], dtype=np.float32)
+
+# Innings weigh more as the game runs out; extra innings count as the ninth.
+FINAL_INNING = 9
+
+HIT_COLUMNS = ("single", "double", "triple", "hr")
+PUTOUT_COLUMNS = tuple(f"po{i}" for i in range(10))
+ASSIST_COLUMNS = tuple(f"a{i}" for i in range(1, 10))
+ERROR_COLUMNS = tuple(f"e{i}" for i in range(1, 10))
+
+
+def _numbers(plays, column, dtype):
+    if column not in plays.columns:
+        return np.zeros(len(plays), dtype=dtype)
+    return plays[column].fillna(0).to_numpy().astype(dtype)
+
+def _row_sum(plays, columns, dtype=np.int16):
+    present = [column for column in columns if column in plays.columns]
+    if not present:
+        return np.zeros(len(plays), dtype=dtype)
+    return plays[present].fillna(0).to_numpy().astype(dtype).sum(axis=1, dtype=dtype)
+
+def _occupied(plays, column):
+    # A base is occupied when its runner column holds a runner id.
+    if column not in plays.columns:
+        return np.zeros(len(plays), dtype=bool)
+    runners = plays[column]
+    return (runners.notna() & (runners.astype(str) != "")).to_numpy()
+
+
+class GameState:
+    """
+    The state before and after every play of a game, computed from a
+    fetch_plays DataFrame in one vectorized pass. Each attribute is an array
+    indexed by play position, so per-play lookups are plain indexing.
+
+    Scores are after the play, as the win-probability features expect;
+    home_lead is the home team's lead before it. home_batting follows the
+    vis_home column: 1 means the home team is at bat.
+
+    leverage is a rough leverage index of the situation before each play:
+    higher with runners on, late in the game and in a close score. It is
+    1.0 with the bases empty in a tied sixth inning.
+    """
+    __slots__ = (
+        "count", "inning", "top", "home_batting", "outs", "bases", "base_out", "runs",
+        "home_score", "away_score", "home_lead", "leverage",
+        "hits", "putouts", "assists", "errors", "outs_made",
+    )
+
+    def __init__(self, plays):
+        self.count = len(plays)
+        self.inning = _numbers(plays, "inning", np.int16)
+        self.top = _numbers(plays, "top_bot", np.int8) == 0
+        self.home_batting = _numbers(plays, "vis_home", np.int8) == 1
+
+        self.outs = np.clip(_numbers(plays, "outs_pre", np.int8), 0, 2)
+        self.bases = (_occupied(plays, "br1_pre") * FIRST
+                      | _occupied(plays, "br2_pre") * SECOND
+                      | _occupied(plays, "br3_pre") * THIRD).astype(np.uint8)
+        self.base_out = (self.outs.astype(np.uint8) * 8 + self.bases).astype(np.uint8)
+
+        self.runs = _numbers(plays, "runs", np.int16)
+        self.home_score = np.cumsum(np.where(self.home_batting, self.runs, 0), dtype=np.int16)
+        self.away_score = np.cumsum(np.where(self.home_batting, 0, self.runs), dtype=np.int16)
+        # The runs of a play count for the batting team, so the lead before it
+        # is the lead after it minus or plus those runs.
+        self.home_lead = (self.home_score - self.away_score - np.where(self.home_batting, self.runs, -self.runs)).astype(np.int16)
+        # Runs the runners on base are worth, on top of what the batter alone brings.
+        runners = 1 + RUN_EXPECTANCY[self.base_out] - RUN_EXPECTANCY[self.outs.astype(np.uint8) * 8]
+        innings = 0.5 + np.minimum(self.inning, FINAL_INNING) / (FINAL_INNING * 4 / 3)
+        closeness = 1 / (1 + np.abs(self.home_lead) / 2)
+        self.leverage = (runners * innings * closeness).astype(np.float32)
+
+        self.hits = _row_sum(plays, HIT_COLUMNS)
+        self.putouts = _row_sum(plays, PUTOUT_COLUMNS)
+        self.assists = _row_sum(plays, ASSIST_COLUMNS)
+        self.errors = _row_sum(plays, ERROR_COLUMNS)
+        self.outs_made = (_numbers(plays, "outs_post", np.int8) - _numbers(plays, "outs_pre", np.int8)).astype(np.int8)
+
+    def __len__(self):
+        return self.count
+
+    def bases_label(self, position):
+        """Describe the runners on base before the play, e.g. "Runner on first, Runner on third"."""
+        return BASE_LABELS[self.bases[position]]
+
+    def score(self, position):
+        """Return the (home, away) score after the play."""
+        return int(self.home_score[position]), int(self.away_score[position])
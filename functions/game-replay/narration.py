@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from skyline_core import instrumentation
+import prompt_engine
+
+logger = logging.getLogger(__name__)
+
+# Plays narrated per Gemini request; 1 (or less) turns batching off.
+BATCH_SIZE = max(1, int(os.environ.get("NARRATION_BATCH_SIZE", 10)))
+
+
+def parse_batch(text, count):
+    """
+    Parse a batch narration response into its per-play descriptions.
+
+    Returns:
+        list: `count` descriptions in play order, or None if the response is not
+        a JSON array of `count` strings (the model sometimes wraps it in a code fence).
+    """
+    if not text:
+        return None
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end <= start:
+        return None
+    try:
+        descriptions = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if (not isinstance(descriptions, list) or len(descriptions) != count
+            or not all(isinstance(d, str) and d.strip() for d in descriptions)):
+        return None
+    return [d.strip() for d in descriptions]
+
+def narrate_batch(mode, contexts, generate):
+    """
+    Narrate several plays with a single request.
+
+    Args:
+        mode: "technical" or "casual".
+        contexts: Play contexts from prompt_engine.play_context, in play order.
+        generate: Sends a prompt to Gemini and returns the response text.
+
+    Returns:
+        list: One description per context, or None when the response could not be parsed.
+    """
+    prompt = prompt_engine.batch_prompt(mode, contexts)
+    with instrumentation.span("narration_batch", mode=mode):
+        descriptions = parse_batch(generate(prompt), len(contexts))
+    instrumentation.increment("narration_batches_total", result="ok" if descriptions else "unparsed")
+    if descriptions is None:
+        logger.warning(f"Could not parse the narration of a {len(contexts)} play batch.")
+    return descriptions
+
+def narrate_plays(mode, positions, context_for, narrate_one, generate):
+    """
+    Narrate the plays at `positions` in one batch, narrating them one by one if
+    the batch fails.
+
+    Returns:
+        dict: Descriptions keyed by position.
+    """
+    positions = list(positions)
+    descriptions = None
+    try:
+        descriptions = narrate_batch(mode, [context_for(p) for p in positions], generate)
+    except Exception as e:
+        logger.warning(f"Batch narration failed, narrating plays one by one: {e}")
+    if descriptions is None:
+        instrumentation.increment("narration_fallback_plays_total", len(positions))
+        descriptions = [narrate_one(p) for p in positions]
+    return dict(zip(positions, descriptions))
+
+def narrate_game(mode, count, context_for, narrate_one, generate, batch_size=BATCH_SIZE):
+    """Narrate all `count` plays of a game in batches, for pre-generation."""
+    batch_size = max(1, batch_size)
+    descriptions = {}
+    for start in range(0, count, batch_size):
+        descriptions.update(narrate_plays(mode, range(start, min(start + batch_size, count)),
+                                          context_for, narrate_one, generate))
+    return [descriptions[position] for position in range(count)]
+
+
+class StoredNarrator:
+    """Serves a game's pre-generated narration through the Narrator interface."""
+
+    def __init__(self, descriptions):
+        self.descriptions = descriptions
+
+    def get(self, position):
+        return self.descriptions[position]
+
+    def close(self):
+        pass
+
+
+class Narrator:
+    """
+    Narrates a game for one stream. The first play requested is narrated on its
+    own so the stream starts as fast as before; the following plays are narrated
+    in batches of `batch_size`, fetched in the background while the viewer
+    reads the current batch.
+    """
+
+    def __init__(self, mode, count, context_for, narrate_one, generate, batch_size=BATCH_SIZE):
+        self.mode = mode
+        self.count = count
+        self.batch_size = max(1, batch_size)
+        self._context_for = context_for
+        self._narrate_one = narrate_one
+        self._generate = generate
+        self._batches = {}
+        self._next_start = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="narrator") if self.batch_size > 1 else None
+
+    def _schedule(self, start):
+        end = min(start + self.batch_size, self.count)
+        self._next_start = end
+        if start >= end:
+            return
+        future = self._executor.submit(
+            narrate_plays, self.mode, range(start, end), self._context_for, self._narrate_one, self._generate
+        )
+        for position in range(start, end):
+            self._batches[position] = future
+
+    def get(self, position):
+        """Return the description of the play at `position`."""
+        if self._executor is None:
+            return self._narrate_one(position)
+        future = self._batches.pop(position, None)
+        if future is not None:
+            description = future.result().get(position)
+        else:
+            description = self._narrate_one(position)
+            if self._next_start is None or self._next_start <= position:
+                self._schedule(position + 1)
+        # Start on the next batch once half of the current one has been streamed.
+        if self._next_start - position <= max(1, self.batch_size // 2):
+            self._schedule(self._next_start)
+        return description
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,229 @@
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Seconds a prediction may take before the caller gives up on it. Override
+# per endpoint with PredictionClient.configure.
+DEADLINE = float(os.environ.get("VERTEX_DEADLINE_SECONDS", 5))
+# Send a second copy of a request still running after the endpoint's p95 latency.
+HEDGE = os.environ.get("VERTEX_HEDGE", "1") == "1"
+# Successful calls needed before the p95 is trusted for hedging.
+HEDGE_MIN_SAMPLES = 20
+# The breaker opens when at least BREAKER_ERROR_RATE of the last BREAKER_WINDOW
+# calls failed (once BREAKER_MIN_CALLS were made), and lets a trial call
+# through after BREAKER_COOLDOWN seconds.
+BREAKER_ERROR_RATE = float(os.environ.get("VERTEX_BREAKER_ERROR_RATE", 0.5))
+BREAKER_WINDOW = int(os.environ.get("VERTEX_BREAKER_WINDOW", 20))
+BREAKER_MIN_CALLS = int(os.environ.get("VERTEX_BREAKER_MIN_CALLS", 10))
+BREAKER_COOLDOWN = float(os.environ.get("VERTEX_BREAKER_COOLDOWN_SECONDS", 30))
+# Threads issuing predictions; bounds the calls in flight per instance.
+MAX_WORKERS = int(os.environ.get("VERTEX_MAX_WORKERS", 32))
+
+LATENCY_WINDOW = 200
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the endpoint while its circuit breaker is open."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when a prediction did not complete within its deadline."""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over a sliding window of recent calls."""
+
+    def __init__(self, error_rate=BREAKER_ERROR_RATE, window=BREAKER_WINDOW,
+                 min_calls=BREAKER_MIN_CALLS, cooldown=BREAKER_COOLDOWN):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = collections.deque(maxlen=window)
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """Return True if a call may go through: the breaker is closed, or this is the trial call after the cooldown."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._trial and time.monotonic() - self._opened_at >= self.cooldown:
+                self._trial = True
+                return True
+            return False
+
+    def record(self, success):
+        with self._lock:
+            if self._opened_at is not None:
+                if not self._trial:
+                    return
+                # Outcome of the trial call: close, or stay open for another cooldown.
+                self._trial = False
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.error_rate * len(self._outcomes):
+                self._opened_at = time.monotonic()
+
+
+class EndpointStats:
+    """Latency window and call counters for one endpoint."""
+
+    def __init__(self):
+        self.latencies_ms = collections.deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.short_circuits = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_latency(self, elapsed_ms):
+        with self._lock:
+            self.latencies_ms.append(elapsed_ms)
+
+    def percentile(self, percent):
+        with self._lock:
+            latencies = sorted(self.latencies_ms)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))]
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "short_circuits": self.short_circuits,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+        }
+
+
+class PredictionClient:
+    """
+    Wraps PredictionServiceClient.predict with a deadline, a circuit breaker
+    and hedging for each endpoint.
+
+    Args:
+        client_factory: Returns the PredictionServiceClient.
+        deadline: Default seconds before a call is abandoned.
+        hedge: Whether to send a second copy of calls slower than the endpoint's p95.
+    """
+
+    def __init__(self, client_factory, deadline=DEADLINE, hedge=HEDGE, max_workers=MAX_WORKERS):
+        self._client_factory = client_factory
+        self.deadline = deadline
+        self.hedge = hedge
+        self._deadlines = {}
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vertex")
+
+    def configure(self, endpoint_id, deadline=None):
+        """Set the deadline of `endpoint_id`."""
+        if deadline is not None:
+            self._deadlines[endpoint_id] = deadline
+
+    def _endpoint(self, endpoint_id):
+        with self._lock:
+            if endpoint_id not in self._stats:
+                self._stats[endpoint_id] = EndpointStats()
+                self._breakers[endpoint_id] = CircuitBreaker()
+            return self._breakers[endpoint_id], self._stats[endpoint_id]
+
+    def _call(self, endpoint_id, stats, deadline, kwargs):
+        started = time.perf_counter()
+        with instrumentation.span("vertex", endpoint=endpoint_id):
+            response = self._client_factory().predict(timeout=deadline, **kwargs)
+        stats.record_latency((time.perf_counter() - started) * 1000)
+        return response
+
+    def predict(self, endpoint_id, **kwargs):
+        """
+        Call predict on `endpoint_id` with `kwargs` (endpoint, instances, parameters).
+
+        Raises:
+            CircuitOpenError: If the endpoint's breaker is open.
+            DeadlineExceededError: If no response arrived within the deadline.
+        """
+        breaker, stats = self._endpoint(endpoint_id)
+        stats.count("calls")
+        if not breaker.allow():
+            stats.count("short_circuits")
+            instrumentation.increment("vertex_short_circuits_total", endpoint=endpoint_id)
+            raise CircuitOpenError(f"Circuit open for endpoint {endpoint_id}")
+
+        deadline = self._deadlines.get(endpoint_id, self.deadline)
+        started = time.monotonic()
+        futures = [self._executor.submit(self._call, endpoint_id, stats, deadline, kwargs)]
+        hedge_after = stats.percentile(95) if self.hedge and len(stats.latencies_ms) >= HEDGE_MIN_SAMPLES else None
+        try:
+            if hedge_after is not None and hedge_after / 1000 < deadline:
+                done, _ = wait(futures, timeout=hedge_after / 1000)
+                if not done and not breaker.is_open:
+                    stats.count("hedges")
+                    instrumentation.increment("vertex_hedges_total", endpoint=endpoint_id)
+                    futures.append(self._executor.submit(self._call, endpoint_id, stats, deadline, kwargs))
+            winner = self._first_result(futures, started + deadline)
+            if winner is not futures[0]:
+                stats.count("hedge_wins")
+            breaker.record(True)
+            return winner.result()
+        except DeadlineExceededError:
+            stats.count("timeouts")
+            instrumentation.increment("vertex_timeouts_total", endpoint=endpoint_id)
+            breaker.record(False)
+            raise
+        except Exception:
+            stats.count("errors")
+            breaker.record(False)
+            raise
+        finally:
+            instrumentation.gauge("vertex_breaker_open", int(breaker.is_open), endpoint=endpoint_id)
+
+    def _first_result(self, futures, deadline_at):
+        # The first future to succeed; an error only counts once every copy failed.
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError("No prediction within the deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future
+                error = future.exception()
+        raise error
+
+    def stats(self):
+        """Return the latency and error stats of every endpoint called so far."""
+        with self._lock:
+            endpoints = dict(self._stats)
+            breakers = dict(self._breakers)
+        return {endpoint_id: {**stats.to_dict(), "breaker_open": breakers[endpoint_id].is_open}
+                for endpoint_id, stats in endpoints.items()}
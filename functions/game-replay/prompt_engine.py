@@ -0,0 +1,135 @@
+import logging
+import re
+import string
+from skyline_core import instrumentation
+import prompts
+
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"[ \t]+")
+
+# Rough characters-per-token ratio for Gemini on English prompts.
+CHARS_PER_TOKEN = 4
+
+
+def compact(text):
+    """Strip indentation, runs of spaces and blank lines, which only cost input tokens."""
+    lines = (_SPACES.sub(" ", line).strip() for line in text.strip().splitlines())
+    return "\n".join(line for line in lines if line)
+
+def estimate_tokens(text):
+    """Estimate the number of input tokens in `text`."""
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+class PromptTemplate:
+    """A prompt compacted and parsed once, then rendered per play."""
+    __slots__ = ("name", "text", "fields")
+
+    def __init__(self, name, template):
+        self.name = name
+        self.text = compact(template)
+        self.fields = frozenset(field for _, field, _, _ in string.Formatter().parse(self.text) if field)
+
+    def render(self, **values):
+        """
+        Fill in the template.
+
+        Raises:
+            KeyError: If a field of the template has no value.
+            TypeError: If a value matches no field, which usually means a misspelled name.
+        """
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Prompt {self.name} is missing values for {sorted(missing)}")
+        unexpected = values.keys() - self.fields
+        if unexpected:
+            raise TypeError(f"Prompt {self.name} has no fields {sorted(unexpected)}")
+        prompt = self.text.format(**values)
+        tokens = estimate_tokens(prompt)
+        instrumentation.increment("prompt_renders_total", template=self.name)
+        instrumentation.increment("prompt_tokens_total", tokens, template=self.name)
+        logger.debug(f"Rendered {self.name} prompt: ~{tokens} tokens")
+        return prompt
+
+
+TEMPLATES = {
+    "technical": PromptTemplate("technical", prompts.TECHNICAL_PLAY_PROMPT),
+    "casual": PromptTemplate("casual", prompts.CASUAL_PLAY_PROMPT),
+    "technical_context": PromptTemplate("technical_context", prompts.TECHNICAL_PLAY_CONTEXT),
+    "casual_context": PromptTemplate("casual_context", prompts.CASUAL_PLAY_CONTEXT),
+    "batch": PromptTemplate("batch", prompts.BATCH_NARRATION_PROMPT),
+    "win_explanation": PromptTemplate("win_explanation", prompts.WIN_EXPLANATION_PROMPT),
+    "play_label": PromptTemplate("play_label", prompts.PLAY_LABEL_PROMPT),
+    "pitch_label": PromptTemplate("pitch_label", prompts.PITCH_PREDICTION_PROMPT),
+}
+
+INSTRUCTIONS = {
+    "technical": compact(prompts.TECHNICAL_PLAY_INSTRUCTIONS),
+    "casual": compact(prompts.CASUAL_PLAY_INSTRUCTIONS),
+}
+
+def render(name, **values):
+    """Render the template `name`."""
+    return TEMPLATES[name].render(**values)
+
+
+def play_prompt(mode, play, game, position, batter_name, pitcher_name, fielder_names):
+    """Render the prompt for the selected narration mode only; `game` is the play's game_state.GameState."""
+    name, values = _play_values(mode, play, game, position, batter_name, pitcher_name, fielder_names)
+    return render(name, **values)
+
+def play_context(mode, play, game, position, batter_name, pitcher_name, fielder_names):
+    """Render just the play context of the selected mode, without the instructions, for batching."""
+    name, values = _play_values(mode, play, game, position, batter_name, pitcher_name, fielder_names)
+    return render(f"{name}_context", **values)
+
+def batch_prompt(mode, contexts):
+    """Combine the contexts of several plays into one narration request."""
+    plays = "\n".join(f"#{number}\n{context}" for number, context in enumerate(contexts, start=1))
+    return render("batch", instructions=INSTRUCTIONS[_mode_name(mode)], count=len(contexts), plays=plays)
+
+def _mode_name(mode):
+    return "technical" if mode == "technical" else "casual"
+
+def _play_values(mode, play, game, position, batter_name, pitcher_name, fielder_names):
+    shared = {
+        "event": play["event"],
+        "batter_name": batter_name,
+        "pitcher_name": pitcher_name,
+        "batteam": play["batteam"],
+        "pitteam": play["pitteam"],
+        "pitches": play["pitches"],
+        "hr": play["hr"],
+        "k": play["k"],
+        "er": play["er"],
+        "hits": int(game.hits[position]),
+        "errors": int(game.errors[position]),
+        "fielders": ", ".join(fielder_names),
+    }
+    if _mode_name(mode) == "technical":
+        return "technical", dict(
+            bathand=play["bathand"],
+            pithand=play["pithand"],
+            pa=play["pa"],
+            ab=play["ab"],
+            rbi=play["rbi"],
+            walk=play["walk"],
+            nump=play["nump"],
+            wp=play["wp"],
+            lp=play["lp"],
+            outs_pre=play["outs_pre"],
+            outs_post=play["outs_post"],
+            putouts=int(game.putouts[position]),
+            assists=int(game.assists[position]),
+            gdp=play["gdp"],
+            tp=play["tp"],
+            bip=play["bip"],
+            **shared,
+        )
+    return "casual", dict(
+        outs_made=int(game.outs_made[position]),
+        double_play="yes" if play["gdp"] else "no",
+        bases=game.bases_label(position),
+        **shared,
+    )
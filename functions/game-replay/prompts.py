@@ -1,4 +1,5 @@
-# TODO put all prompts in this file
+# Prompt templates. Placeholders are filled by prompt_engine, which also strips
+# the indentation below before anything is sent to the model.
 
 PITCH_PREDICTION_PROMPT = """
     Based on this guideline - 
@@ -31,5 +32,66 @@ PITCH_PREDICTION_PROMPT = """
     pitch timer violation
     X - ball put into play by batter
     Y - ball put into play on pitchout
-    What does {} pitch translate to in baseball? Explain in 3 words
+    What does {label} pitch translate to in baseball? Explain in 3 words
+"""
+
+TECHNICAL_PLAY_INSTRUCTIONS = """
+    Act as a baseball analyst and give a high-level breakdown of the strategy behind this play:
+    pitch type, sequencing, how the game context shapes strategy, the batter-pitcher matchup,
+    defensive positioning and expected outcomes.
+    Use advanced terminology in 1-2 concise sentences focused on tactical insight, not play-by-play.
+    Do not include the play shorthand in the response.
+"""
+
+TECHNICAL_PLAY_CONTEXT = """
+    Play: {event}
+    Batter: {batter_name}, bats {bathand}, {batteam} - PA {pa}, AB {ab}, hits {hits}, HR {hr}, RBI {rbi}, walks {walk}
+    Pitcher: {pitcher_name}, throws {pithand}, {pitteam} - pitches {pitches} ({nump}), K {k}, ER {er}, wild pitches {wp}, loss {lp}
+    Fielding: outs {outs_pre} to {outs_post}, putouts {putouts}, assists {assists}, errors {errors}, GDP {gdp}, triple play {tp}, ball in play {bip}
+    Fielders: {fielders}
+"""
+
+TECHNICAL_PLAY_PROMPT = TECHNICAL_PLAY_INSTRUCTIONS + TECHNICAL_PLAY_CONTEXT
+
+CASUAL_PLAY_INSTRUCTIONS = """
+    Act as a baseball analyst and explain the strategy behind this play for casual fans:
+    why it matters and which offensive or defensive decisions were involved, such as
+    pitch selection, base running or field positioning.
+    Keep it engaging and limited to 1-2 sentences.
+    Do not include the play shorthand in the response.
+"""
+
+CASUAL_PLAY_CONTEXT = """
+    Play: {event}
+    Batter: {batter_name}, {batteam} - hits {hits}, home runs {hr}
+    Pitcher: {pitcher_name}, {pitteam} - pitches {pitches}, strikeouts {k}, earned runs {er}
+    Fielding: outs made {outs_made}, errors {errors}, double play {double_play}, {bases}
+    Fielders: {fielders}
+"""
+
+CASUAL_PLAY_PROMPT = CASUAL_PLAY_INSTRUCTIONS + CASUAL_PLAY_CONTEXT
+
+# Narrates many consecutive plays in one request; {instructions} is the
+# technical or casual instruction block and {plays} the numbered play contexts.
+BATCH_NARRATION_PROMPT = """
+    {instructions}
+    Describe each of the following {count} plays separately, following the instructions above for every play.
+    Respond with only a JSON array of exactly {count} strings, one description per play, in the order given.
+
+    {plays}
+"""
+
+WIN_EXPLANATION_PROMPT = """
+    Act as a baseball analyst and concisely explain the current play's impact on the win probability
+    of the home team {home_team}. The win probability changed by {probability_change:.2f}% and the visiting team is {away_team}.
+    Current play: {event}, batter: {batter_name}, pitcher: {pitcher_name}, inning: {inning},
+    outs: {outs}, bases: {bases}, score: {home_runs}-{away_runs}, visiting team play: {is_visiting_team_play},
+    leverage: {leverage:.1f} (1.0 is an average situation; above 1.5 the moment was tense, below 0.7 low stakes)
+    Limit the response to 1 and a half sentences.
+"""
+
+PLAY_LABEL_PROMPT = """
+    Act as a baseball analyst and describe this play, written in Retrosheet shorthand notation.
+    Current play: {event}
+    Limit the response to 4 words
 """
@@ -1,17 +1,32 @@
-import os
 import time
+_import_started = time.perf_counter()
+import os
 import datetime
+import functools
+import hmac
 import traceback
 import logging
 import json
+import signal
+import sys
 import requests
 from flask import Flask, jsonify, Response, request, stream_with_context
-from google.cloud import bigquery, firestore, aiplatform
-import vertexai
-from vertexai.generative_models import GenerativeModel, SafetySetting
 from google.protobuf.json_format import ParseDict
 from google.protobuf.struct_pb2 import Value
-from prompts import PITCH_PREDICTION_PROMPT
+import prompt_engine
+import game_state
+import compact_game
+import win_expectancy
+import narration
+import warehouse
+from skyline_core import queries
+from skyline_core import instrumentation
+from skyline_core import clients
+from skyline_core import responses
+from skyline_core import schedule
+import prediction_client
+import replay_state
+import sessions
 
 app = Flask(__name__)
 app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 300
@@ -19,31 +34,57 @@ app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 300
 project_id = os.environ["PROJECT_ID"]
 project_name = os.environ["PROJECT_NAME"]
 db_name = os.environ["DEFAULT_DATABASE"]
-bq_client = bigquery.Client()
-db = firestore.Client(database=db_name)
 location = "us-central1"
-ai_client = aiplatform.gapic.PredictionServiceClient(client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"})
 
 DEFAULT_TIMEOUT = 300  # 5 minutes
+PLAYS_TIMEOUT = 10  # Seconds to wait for a game's plays from BigQuery
 
 p_endpoint_id = os.environ.get("PITCH_PREDICTION_ENDPOINT_ID")
 w_endpoint_id = os.environ.get("WIN_PREDICTION_ENDPOINT_ID")
 b_endpoint_id = os.environ.get("BATTING_PREDICTION_ENDPOINT_ID")
 location = "us-central1"
 player_cache = {}
+state_store = replay_state.create_store(clients.firestore_client)
+session_registry = sessions.SessionRegistry()
+narration_store = warehouse.NarrationStore(clients.firestore_client)
+game_cache = compact_game.GameCache()
+schedule_resolver = schedule.ScheduleResolver(clients.bigquery_client)
+predictor = prediction_client.PredictionClient(clients.prediction_client)
+for _endpoint_id, _deadline in ((w_endpoint_id, os.environ.get("WIN_PREDICTION_DEADLINE_SECONDS")),
+                                (p_endpoint_id, os.environ.get("PITCH_PREDICTION_DEADLINE_SECONDS"))):
+    if _endpoint_id and _deadline:
+        predictor.configure(_endpoint_id, deadline=float(_deadline))
+
+plays_query = queries.prepare(queries.PLAYS_QUERY, f"{project_name}.baseball_custom_dataset.2023-2024-plays_v3")
+player_names_query = queries.prepare(queries.PLAYER_NAMES_QUERY, f"{project_name}.baseball_custom_dataset.2023-2024-players")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PLAYER_COLUMNS = ("batter", "pitcher", *(f"f{i}" for i in range(2, 10)))
+
+# Bearer token Cloud Scheduler sends to the maintenance routes (/reap,
+# /pregenerate). They refuse every request while it is unset.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
 
-def save_state(user_id, state):
-    db.collection("replay_states").document(user_id).set(state)
+def require_admin_token(route):
+    """Allow a route only for requests carrying "Authorization: Bearer <ADMIN_TOKEN>"."""
+    @functools.wraps(route)
+    def guarded(*args, **kwargs):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if not ADMIN_TOKEN or scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+            return jsonify({"error": "Unauthorized."}), 401
+        return route(*args, **kwargs)
+    return guarded
+
+
+def save_state(user_id, state, flush=True):
+    """Save replay state. Progress updates pass flush=False so they are coalesced."""
+    state_store.save(user_id, state, flush=flush)
 
 def load_state(user_id):
-    doc = db.collection("replay_states").document(user_id).get()
-    if doc.exists:
-        return doc.to_dict()
-    return {"is_paused": False, "current_play_index": 0, "last_active": datetime.datetime.now(datetime.UTC)}
+    return state_store.load(user_id)
 
 @app.route('/pause', methods=['POST'])
 def pause_replay():
@@ -56,12 +97,14 @@ def pause_replay():
         return jsonify({"error": "Missing 'user_id', 'gid', 'mode', or 'interval'."}), 400
 
     state = load_state(user_id)
-    state["is_paused"] = True
-    state["last_active"] = datetime.datetime.now(datetime.UTC)
-    state["gid"] = gid
-    state["mode"] = mode
-    state["interval"] = interval
+    state.is_paused = True
+    state.last_active = datetime.datetime.now(datetime.UTC)
+    state.gid = gid
+    state.mode = mode
+    state.interval = interval
     save_state(user_id, state)
+    # Streams on this instance stop right away; ones elsewhere see the flag at their next play.
+    session_registry.stop_user(user_id)
 
     logger.info(f"Replay paused for user {user_id}.")
     return jsonify({"message": f"Replay paused for user {user_id}."}), 200
@@ -73,9 +116,9 @@ def resume_replay():
         return jsonify({"error": "Missing 'user_id'."}), 400
 
     state = load_state(user_id)
-    if state["is_paused"]:
-        state["is_paused"] = False
-        state["last_active"] = datetime.datetime.now(datetime.UTC)
+    if state.is_paused:
+        state.is_paused = False
+        state.last_active = datetime.datetime.now(datetime.UTC)
         save_state(user_id, state)
         logger.info(f"Replay resumed for user {user_id}.")
         return _resume_replay(user_id)
@@ -98,19 +141,22 @@ def game_replay():
     try:
         # Initialize state
         state = load_state(user_id)
-        state["gid"] = gid
-        state["mode"] = mode
-        state["interval"] = interval
-        if state["last_active"] is None:
-            state["last_active"] = datetime.datetime.now(datetime.UTC)
+        state.gid = gid
+        state.mode = mode
+        state.interval = interval
+        if state.last_active is None:
+            state.last_active = datetime.datetime.now(datetime.UTC)
         save_state(user_id, state)
 
-        plays = fetch_plays(gid)
-        
-        return Response(stream_replay(user_id, plays, mode, interval), content_type="text/event-stream", headers={
+        plays = load_game(gid)
+        session = session_registry.open(user_id, "replay", gid)
+
+        return Response(session_registry.stream(session, stream_replay(user_id, plays, mode, interval, session=session)), content_type="text/event-stream", headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
         })
+    except sessions.SessionLimitError as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         error_message = str(e)
         stack_trace = traceback.format_exc()
@@ -130,10 +176,47 @@ def get_last_10_games():
     """
     game_type = request.args.get('game_type', 'regular')
     try:
-        games = fetch_last_10_games(game_type=game_type)
-        return Response(json.dumps(games, indent=4), mimetype='application/json'), 200
+        games = schedule_resolver.fetch_last_10_games(game_type=game_type)
+        if game_type in warehouse.GAME_TYPES:
+            pregenerator.notify(games)
+        return responses.json_response(games, max_age=int(schedule.RECENT_GAMES_TTL), route="/games")
     except Exception as e:
-        return Response(json.dumps({"error": str(e)}, indent=4), mimetype='application/json'), 500
+        return responses.json_response({"error": str(e)}, status=500, route="/games")
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose latency histograms and counters in the Prometheus text format."""
+    for endpoint_id, stats in predictor.stats().items():
+        if stats["p95_ms"] is not None:
+            instrumentation.gauge("vertex_latency_p95_ms", round(stats["p95_ms"], 1), endpoint=endpoint_id)
+    return Response(instrumentation.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/reap', methods=['POST'])
+@require_admin_token
+def reap_replay_states():
+    """Stop idle streams and delete stale replay states. Meant for Cloud Scheduler."""
+    try:
+        stopped = session_registry.stop_idle()
+        deleted = sessions.reap_idle_states(clients.firestore_client())
+        return jsonify({"stopped_streams": stopped, "deleted_states": deleted}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/pregenerate', methods=['POST'])
+@require_admin_token
+def pregenerate_narration():
+    """
+    Pre-generate narration, win timelines and key-play labels for the games on
+    the /games lists, skipping games that are already stored. Meant for Cloud Scheduler.
+    """
+    try:
+        games = [game for game_type in warehouse.GAME_TYPES for game in schedule_resolver.fetch_last_10_games(game_type=game_type)]
+        result = pregenerator.run(games)
+        if result is None:
+            return jsonify({"status": "A pre-generation run is already in progress."}), 409
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @app.route('/predict-pitch', methods=['POST'])
 def predict_pitch():
@@ -144,49 +227,48 @@ def predict_pitch():
 
     try:
         state = load_state(user_id)
-        gid = state.get("gid")
-        interval = state.get("interval")
-        current_index = state.get("current_play_index", 0)
+        gid = state.gid
+        interval = state.interval
+        current_index = state.current_play_index
 
         if not gid or not interval:
             return jsonify({"error": "Missing 'gid' or 'interval' in state."}), 400
 
-        plays = fetch_plays(gid)
+        plays = load_game(gid)
+        session = session_registry.open(user_id, "pitch", gid)
+
+        return Response(session_registry.stream(session, stream_pitch_predictions(user_id, plays, current_index, interval, session)), content_type="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        })
+    except sessions.SessionLimitError as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        error_message = str(e)
+        stack_trace = traceback.format_exc()
+        line_number = stack_trace.splitlines()[-3]
+        return jsonify({"error": error_message, "stack_trace": stack_trace, "line_number": line_number}), 500
 
-        for index, play in plays.iterrows():
+def stream_pitch_predictions(user_id, plays, current_index, interval, session):
+    """Stream a pitch prediction for each play from `current_index` until the replay pauses or `session` stops."""
+    try:
+        for index, play in enumerate(plays):
             if index < current_index:
                 continue
 
-            state = load_state(user_id)
-            is_paused = state.get("is_paused", False)
-
-            if is_paused:
+            if state_store.is_paused(user_id):
                 break
 
             try:
-                last_pitch = play.pitches.split(",")[-1] if play.pitches else "unknown"
-                features = {
-                    "pitcher_team": play.pitcher_team,
-                    "batter_team": play.batter_team,
-                    "bathand": play.bathand,
-                    "pithand": play.pithand,
-                    "inning": play.inning,
-                    "top_bot": play.top_bot,
-                    "vis_home": play.vis_home,
-                    "count": play.count,
-                    "pitch_num_in_pa": play.pitch_num_in_pa,
-                    "last_pitch": last_pitch
-                }
-                prediction = get_predictions_from_model(project_id, p_endpoint_id, features)
-                prediction["pitcher_name"] = get_player_name(play["pitcher"])
-                prediction["pitch_human_label"] = prompt_gemini_api(PITCH_PREDICTION_PROMPT.format(prediction["predicted_label"]))
-                logger.info(f"Predicted pitch: {prediction}")
+                with instrumentation.span("play", route="predict_pitch"):
+                    prediction = _predict_pitch(play)
                 yield f"data: {json.dumps({'prediction': prediction})}\n\n"
 
             except Exception as e:
                 yield f"data: Error predicting pitch: {str(e)}\n\n"
 
-            time.sleep((interval)) # Show prediction before next play
+            if session.wait(interval): # Show prediction before next play
+                break
 
     except Exception as e:
         error_message = str(e)
@@ -194,18 +276,56 @@ def predict_pitch():
         line_number = stack_trace.splitlines()[-3]
         yield f"data: Error during prediction: {error_message}, stack_trace: {stack_trace}, line_number: {line_number}\n\n"
 
+def _predict_pitch(play):
+    """Predict the next pitch for a single play and label it for display."""
+    last_pitch = play.pitches.split(",")[-1] if play.pitches else "unknown"
+    features = {
+        "pitcher_team": play.pitcher_team,
+        "batter_team": play.batter_team,
+        "bathand": play.bathand,
+        "pithand": play.pithand,
+        "inning": play.inning,
+        "top_bot": play.top_bot,
+        "vis_home": play.vis_home,
+        "count": play.count,
+        "pitch_num_in_pa": play.pitch_num_in_pa,
+        "last_pitch": last_pitch
+    }
+    prediction = get_predictions_from_model(project_id, p_endpoint_id, features)
+    prediction["pitcher_name"] = get_player_name(play["pitcher"])
+    prediction["pitch_human_label"] = prompt_gemini_api(prompt_engine.render("pitch_label", label=prediction["predicted_label"]))
+    logger.info(f"Predicted pitch: {prediction}")
+    return prediction
+
 @app.route('/predict-win', methods=['GET'])
 def predict_wins():
-    """Predict win probabilities for each play."""
+    """
+    Predict win probabilities for each play.
+
+    Query Parameters:
+        gid (str): The game to predict.
+        game_pk (str): Its Stats API gamePk, used to link key plays to video.
+        layout (str): "rows" (default) for one object per play, or "columns"
+            for parallel arrays (see win_probability_columns).
+    """
     gid = request.args.get("gid")
     game_pk = request.args.get("game_pk", None)
+    layout = request.args.get("layout", "rows")
     
     if not gid:
         return jsonify({"error": "Missing 'gid' parameter."}), 400
+    if layout not in ("rows", "columns"):
+        return jsonify({"error": "'layout' must be 'rows' or 'columns'."}), 400
     
     try:
-        predictions = _predict_wins(gid, game_pk)
-        return jsonify({"predictions": predictions})
+        predictions = narration_store.timeline(gid)
+        # Stored timelines are of finished games and never change.
+        stored = predictions is not None
+        if not stored:
+            predictions = _predict_wins(gid, game_pk)
+        if layout == "columns":
+            predictions = win_probability_columns(predictions)
+        return responses.json_response({"predictions": predictions}, immutable=stored, route="/predict-win")
     except Exception as e:
         error_message = str(e)
         stack_trace = traceback.format_exc()
@@ -216,104 +336,171 @@ def predict_wins():
             "line_number": line_number
         }), 500
 
+def win_probability_columns(predictions):
+    """
+    Lay out /predict-win predictions as parallel arrays instead of one object
+    per play.
+
+    Returns:
+        dict: home_team once for the game, inning and win_probability with one
+        entry per play, and key_plays holding each key play with the index of
+        its play (its inning and win_probability are in the arrays).
+    """
+    key_plays = []
+    for index, prediction in enumerate(predictions):
+        key_play = prediction.get("key_play")
+        if key_play:
+            key_plays.append({"index": index, **{
+                key: value for key, value in key_play.items() if key not in ("inning", "win_probability")
+            }})
+    return {
+        "home_team": predictions[0]["home_team"] if predictions else None,
+        "inning": [prediction["inning"] for prediction in predictions],
+        "win_probability": [prediction["win_probability"] for prediction in predictions],
+        "key_plays": key_plays,
+    }
+
 def _resume_replay(user_id):
     """Internal function to resume game replays and stream play-by-play summaries."""
     try:
         state = load_state(user_id)
-        gid = state.get("gid")
-        mode = state.get("mode")
-        interval = state.get("interval")
+        gid = state.gid
+        mode = state.mode
+        interval = state.interval
 
         if not gid or not mode or not interval:
             return jsonify({"error": "Missing 'gid', 'mode', or 'interval' in state."}), 400
 
-        plays = fetch_plays(gid)
+        plays = load_game(gid)
+        session = session_registry.open(user_id, "replay", gid)
 
-        return Response(stream_replay(user_id, plays, mode, interval, resume=True), content_type="text/event-stream", headers={
+        return Response(session_registry.stream(session, stream_replay(user_id, plays, mode, interval, resume=True, session=session)), content_type="text/event-stream", headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
         })
+    except sessions.SessionLimitError as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         error_message = str(e)
         stack_trace = traceback.format_exc()
         line_number = stack_trace.splitlines()[-3]
         return jsonify({"error": error_message, "stack_trace": stack_trace, "line_number": line_number}), 500
 
-def _predict_wins(gid, game_pk):
-    """Calculate win probability predictions for all plays in a game."""
+def _predict_wins(gid, game_pk, generate=None, mode=None):
+    """Return the win probability predictions for all plays in a game; see predict_win_timeline."""
+    return predict_win_timeline(gid, game_pk, generate, mode)[0]
+
+def predict_win_timeline(gid, game_pk, generate=None, mode=None):
+    """
+    Calculate win probability predictions for all plays in a game. `mode` is
+    one of win_expectancy.MODES and picks between the Vertex endpoint and the
+    local win expectancy table; it defaults to WIN_EXPECTANCY_MODE.
+
+    Returns:
+        tuple: (predictions, complete). complete is False when the timeline is
+        degraded: a play was skipped or not scored the way `mode` intends (a
+        local value where the endpoint should have answered), or Gemini failed
+        to label or explain a key play. Only complete timelines are stored.
+    """
+    generate = generate or prompt_gemini_api
+    mode = mode or win_expectancy.MODE
     try:
-        plays = fetch_plays(gid)
+        plays = load_game(gid)
+        game = plays.state
+        local = win_expectancy.home_win_probability(game) if mode != "remote" else None
+        ambiguous = win_expectancy.ambiguous(local) if mode == "prefilter" else None
+        EXCLUDED_COLUMNS = {
+            "gid", "batter", "ballpark", "bathand", "pithand", "pbp", 
+            "rbi", "er", "run_b", "run1", "run2", "run3", "prun1", "prun2", "prun3",
+            "outs_post", "br1_post", "br2_post", "br3_post", "bat_f",
+            "gametype", "event_order", "vis_home", "pitcher"
+        }
+
+        # Score every play first, then look for key plays in the scored series.
+        probabilities = [None] * len(plays)
+        sources = [None] * len(plays)
+        complete = True
+        for position, play in enumerate(plays):
+            with instrumentation.span("play", route="predict_win"):
+                intended = "remote" if mode in ("remote", "fallback") or (mode == "prefilter" and ambiguous[position]) else "local"
+                win_probability = None
+                source = "local"
+                if intended == "remote":
+                    home_runs, away_runs = game.score(position)
+                    features = {
+                        key: str(value) for key, value in play.items() if key not in EXCLUDED_COLUMNS
+                    }
+                    features["home_team_runs"] = str(home_runs)
+                    features["away_team_runs"] = str(away_runs)
+
+                    win_probability = get_predictions_from_model(project_id, w_endpoint_id, features)
+                    source = "remote"
+                if win_probability is None and local is not None:
+                    win_probability = round(float(local[position]), 1)
+                    source = "local"
+                if win_probability is None:
+                    # Skip to the next play if prediction fails. 
+                    logger.error(f"Prediction failed for play {position} of {gid}")
+                    complete = False
+                    continue
+                instrumentation.increment("win_probability_source_total", source=source)
+                complete = complete and source == intended
+                probabilities[position] = win_probability
+                sources[position] = source
+
         predictions = []
-        
-        last_win_probability = None
-        home_runs = 0
-        away_runs = 0
-        home_team = ""
-        away_team = ""
-        run_differential = {}
-
-        for index, play in plays.iterrows():
-            is_visting_team_play = False
-            if play["vis_home"] == 1:
-                home_runs += play["runs"]
-                home_team = play["batteam"]
-                away_team = play["pitteam"]
-            else:
-                away_runs += play["runs"]
-                is_visting_team_play = True
+        last_position = None
+        for position, play in enumerate(plays):
+            win_probability = probabilities[position]
+            if win_probability is None:
+                continue
+            is_visting_team_play = not game.home_batting[position]
+            if is_visting_team_play:
                 away_team = play["batteam"] 
                 home_team = play["pitteam"]
+            else:
+                home_team = play["batteam"]
+                away_team = play["pitteam"]
+            home_runs, away_runs = game.score(position)
 
-            #run_differential[index] = home_runs - away_runs
-            EXCLUDED_COLUMNS = {
-                "gid", "batter", "ballpark", "bathand", "pithand", "pbp", 
-                "rbi", "er", "run_b", "run1", "run2", "run3", "prun1", "prun2", "prun3",
-                "outs_post", "br1_post", "br2_post", "br3_post", "bat_f",
-                "gametype", "event_order", "vis_home", "pitcher"
-            }
-            features = {
-                key: str(value) for key, value in play.items() if key not in EXCLUDED_COLUMNS
-            }
-            features["home_team_runs"] = str(home_runs)
-            features["away_team_runs"] = str(away_runs)
-
-            win_probability = get_predictions_from_model(project_id, w_endpoint_id, features)
-            if win_probability is None:
-                # Skip to the next play if prediction fails. 
-                logger.error(f"Prediction failed for play: {win_probability}")
-                continue
-        
             key_play = None
-            
-            if last_win_probability is not None:
-                probability_change = (win_probability) - (last_win_probability)
+        
+            if last_position is not None:
+                if sources[position] == sources[last_position]:
+                    probability_change = (win_probability) - (probabilities[last_position])
+                else:
+                    # Endpoint and table values differ in level, so a change
+                    # across sources (prefilter plays, fallback for a failed
+                    # call) is measured on the table alone; the switch itself
+                    # is not a swing.
+                    probability_change = round(float(local[position] - local[last_position]), 1)
                 # Only consider plays with 'significant' win probability changes
                 # were using 5% as a threshold for significance since there are often small fluctuations in win probability
                 # during the course of a game that are still meaningful to the outcome.
                 if abs(probability_change) > 5:
-                    explanation_prompt = f"""
-                        Act as a baseball analyst and provide a concise explanation of the current play's 
-                        impact on the win probability of the home team : {home_team} 
-                        The win probability changed by {probability_change:.2f}% and the visting team is {away_team}
-                        Current play: {play['event']} batter: {get_player_name(play['batter'])}, 
-                        pitcher: {get_player_name(play['pitcher'])}, inning: {play['inning']}, 
-                        outs: {play['outs_pre']}, bases: {get_bases_state(play)} 
-                        score: {home_runs}-{away_runs}
-                        Visting team play: {is_visting_team_play}
-                        Limit the response to 1 and a half sentences.
-                    """
-                    
-                    play_label_prompt = f"""
-                        Act as a baseball analyst and provide a short description the following play
-                        written in shorthand notation from Retrosheet
-                        Current play: {play['event']}
-                        Limit the response to 4 words
-                    """
-                    play_label = prompt_gemini_api(play_label_prompt)
-                    explanation = prompt_gemini_api(explanation_prompt)
+                    explanation_prompt = prompt_engine.render(
+                        "win_explanation",
+                        home_team=home_team,
+                        away_team=away_team,
+                        probability_change=probability_change,
+                        event=play['event'],
+                        batter_name=get_player_name(play['batter']),
+                        pitcher_name=get_player_name(play['pitcher']),
+                        inning=play['inning'],
+                        outs=play['outs_pre'],
+                        bases=game.bases_label(position),
+                        home_runs=home_runs,
+                        away_runs=away_runs,
+                        is_visiting_team_play=is_visting_team_play,
+                        leverage=float(game.leverage[position]),
+                    )
+                    play_label_prompt = prompt_engine.render("play_label", event=play['event'])
+                    play_label = generate(play_label_prompt)
+                    explanation = generate(explanation_prompt)
+                    complete = complete and play_label is not None and explanation is not None
                     pbp_data = None
                     if game_pk:
-                        pbp_data = fetch_game_pbp(game_pk, play)
+                        pbp_data = fetch_game_pbp(game_pk, play, bool(game.top[position]))
                     else:
                         logging.warning(f"Could not fetch PBP data without game_pk")
                     key_play = {
@@ -324,144 +511,147 @@ def _predict_wins(gid, game_pk):
                         "explanation": explanation,
                         "play_id": pbp_data.get('playId', None) if pbp_data else None  # Ensure correct key
                     }
-            last_win_probability = win_probability
+            last_position = position
 
             data = { 
-                'home_team': play['batteam'] if play['vis_home'] == 1 else play['pitteam'],
+                'home_team': home_team,
                 'inning': play['inning'],
                 'win_probability': win_probability, 
                 'key_play': key_play
             }
             predictions.append(data)
 
-        return predictions
+        return predictions, complete and bool(predictions)
     
     except Exception as e:
         error_message = str(e)
         stack_trace = traceback.format_exc()
         line_number = stack_trace.splitlines()[-3]
         logger.error(f"Error during prediction: {error_message}, stack_trace: {stack_trace}, line_number: {line_number}")  # Add logging here
-        return []
+        return [], False
 
-def stream_replay(user_id, plays, mode, interval, resume=False):
-    """Stream the replay play-by-play."""
+def stream_replay(user_id, plays, mode, interval, resume=False, session=None):
+    """Stream the replay play-by-play. A stopped `session` ends the stream at the next play."""
+    narrator = None
     try:
-        state = load_state(user_id) 
-        current_index = state.get("current_play_index", 0)
+        state = state_store.cached(user_id)
+        current_index = state.current_play_index
+        game = plays.state
+        narrator = _game_narrator(plays, mode, game)
 
-        for index, play in plays.iterrows():
-            if resume and index < current_index:
+        for position, play in enumerate(plays):
+            if resume and position < current_index:
                 continue
 
-            state = load_state(user_id)
-            is_paused = state.get("is_paused", False)
-
-            if is_paused:
-                state["current_play_index"] = index
+            if state_store.is_paused(user_id):
+                state.current_play_index = position
                 save_state(user_id, state)
-                logger.info(f"Replay paused at play index {index} for user {user_id}.")
+                logger.info(f"Replay paused at play index {position} for user {user_id}.")
                 return
 
             try:
-                strategy = generate_play_description(play, mode)
+                with instrumentation.span("play", route="game_replay"):
+                    strategy = narrator.get(position) or "Error generating response."
             except Exception as e:
                 strategy = f"Error generating strategy: {str(e)}"
 
             yield f"data: {strategy}\n\n"
 
-            state["current_play_index"] = index + 1
-            state["last_active"] = datetime.datetime.now(datetime.UTC)
-            save_state(user_id, state)
+            state.current_play_index = position + 1
+            state.last_active = datetime.datetime.now(datetime.UTC)
+            save_state(user_id, state, flush=False)
 
             # Give the user time to read the play
-            time.sleep(interval)
+            if session is not None:
+                if session.wait(interval):
+                    logger.info(f"Replay stream stopped at play index {position + 1} for user {user_id}.")
+                    return
+            else:
+                time.sleep(interval)
 
-        state["current_play_index"] = len(plays)
-        state["is_paused"] = True  # Set paused to true to indicate end of stream
+        state.current_play_index = len(plays)
+        state.is_paused = True  # Set paused to true to indicate end of stream
         save_state(user_id, state)
         yield f"data: Replay complete.\n\n"
 
     except Exception as e:
         yield f"data: Error during stream: {str(e)}\n\n"
+    finally:
+        # Also runs when the client disconnects mid-stream.
+        if narrator is not None:
+            narrator.close()
+        state_store.evict(user_id)
+
+def _game_narrator(plays, mode, game):
+    """
+    Create the narrator for a game: its pre-generated narration when there is
+    one, otherwise a batch narrator. Every player name of the game is resolved
+    up front in one query, so batches only render and call Gemini.
+    """
+    if len(plays):
+        descriptions = narration_store.narration(plays.gid, mode)
+        if descriptions is not None and len(descriptions) == len(plays):
+            return narration.StoredNarrator(descriptions)
+    get_player_names(list(plays.distinct(*PLAYER_COLUMNS)))
+    return narration.Narrator(
+        mode,
+        len(plays),
+        context_for=lambda position: play_context(plays[position], mode, game, position),
+        narrate_one=lambda position: generate_play_description(plays[position], mode, game, position),
+        generate=prompt_gemini_api,
+    )
+
+def narrate_game(gid, mode, generate=None):
+    """
+    Narrate every play of `gid` in `mode` for the narration warehouse.
+
+    Returns:
+        list: One description per play, or None if any play failed.
+    """
+    plays = load_game(gid)
+    game = plays.state
+    get_player_names(list(plays.distinct(*PLAYER_COLUMNS)))
+    generate = generate or prompt_gemini_api
+    descriptions = narration.narrate_game(
+        mode,
+        len(plays),
+        context_for=lambda position: play_context(plays[position], mode, game, position),
+        narrate_one=lambda position: generate_play_description(plays[position], mode, game, position, generate),
+        generate=generate,
+    )
+    # Never store a game with failed plays; the next run retries it.
+    if not all(descriptions) or "Error generating response." in descriptions:
+        return None
+    return descriptions
+
+def _play_names(play):
+    fielder_ids = [play.get(column) for column in PLAYER_COLUMNS[2:]]
+    get_player_names([play['batter'], play['pitcher'], *fielder_ids])
+    batter_name = get_player_name(play['batter'])
+    pitcher_name = get_player_name(play['pitcher'])
+    fielder_names = [get_player_name(fielder_id) for fielder_id in fielder_ids if fielder_id]
+    return batter_name, pitcher_name, fielder_names
+
+def play_context(play, mode, game, position):
+    """Render the instruction-free context of one play, for batch narration."""
+    batter_name, pitcher_name, fielder_names = _play_names(play)
+    return prompt_engine.play_context(
+        mode, play, game, position, batter_name, pitcher_name, fielder_names
+    )
 
-def generate_play_description(play, mode):
-    """Generate a natural language explanation for the play using Gemini Gen AI."""
+def generate_play_description(play, mode, game=None, position=None, generate=None):
+    """
+    Generate a natural language explanation for the play, a compact_game.Play,
+    using Gemini Gen AI. `game` and `position` default to the play's own.
+    """
     try:
-        batter_name = get_player_name(play['batter'])
-        pitcher_name = get_player_name(play['pitcher'])
-        fielder_ids = [play.get(f'f{i}') for i in range(2, 10)]
-        fielder_names = [get_player_name(fielder_id) for fielder_id in fielder_ids if fielder_id]
-        
-        technical_prompt = f"""
-            Act as a baseball analyst and provide a high-level breakdown of the strategy behind this play.
-            Explain the pitch type, sequencing decisions, and how game context influences strategy.
-            Analyze the batter-pitcher matchup, defensive positioning, and expected outcomes.
-            Use advanced terminology, but keep the response concise (1-2 sentences), focused on tactical insights rather than just play-by-play.
-            Do not include the play shorthand in the response."
-
-            Play: {play["event"]}
-            Context:
-            Batter Stats:
-                Batter - {batter_name},
-                Bat Hand - {play["bathand"]},
-                Plate Appearances - {play["pa"]},
-                At-Bats - {play["ab"]},
-                Hits - {play["single"] + play["double"] + play["triple"] + play["hr"]},
-                Home Runs - {play["hr"]},
-                RBIs - {play["rbi"]},
-                Walks - {play["walk"]},
-                Team - {play["batteam"]},
-            Pitcher Stats:
-                Pitcher - {pitcher_name},
-                Pitch Hand - {play["pithand"]},
-                Pitch - {play["pitches"]},
-                Number of Pitches - {play["nump"]},
-                Strikeouts - {play["k"]},
-                Earned Runs - {play["er"]},
-                Wild Pitches - {play["wp"]},
-                Loss Indicator - {play["lp"]},
-                pitcher Team - {play["pitteam"]},
-            Fielding Stats:
-                Outs Before Play - {play["outs_pre"]},
-                Outs After Play - {play["outs_post"]},
-                Putouts by Fielders - {play["po0"] + play["po1"] + play["po2"] + play["po3"] + play["po4"] + play["po5"] + play["po6"] + play["po7"] + play["po8"] + play["po9"]},
-                Assists by Fielders - {play["a1"] + play["a2"] + play["a3"] + play["a4"] + play["a5"] + play["a6"] + play["a7"] + play["a8"] + play["a9"]},
-                Errors - {play["e1"] + play["e2"] + play["e3"] + play["e4"] + play["e5"] + play["e6"] + play["e7"] + play["e8"] + play["e9"]},
-                Grounded into Double Play - {play["gdp"]},
-                Triple Play - {play["tp"]},
-                Ball in Play Indicator - {play["bip"]},
-                Fielders - {', '.join(fielder_names)}
-        """
-        casual_prompt = f"""
-            "Act as a baseball analyst and provide real-time insights into the strategy behind each play.
-            Explain the action clearly and concisely for casual fans.
-            Focus on why the play matters and what strategic decisions were involved.
-            Provide insight into offensive and defensive tactics, such as pitch selection, base running, or field positioning.
-            Keep the response engaging but limited to 1-2 sentences.
-            Do not include the play shorthand in the response.
-            
-            Play: {play["event"]}
-            Context:
-            Batter:
-                Name - {batter_name},
-                Hits - {play["single"] + play["double"] + play["triple"] + play["hr"]},
-                Home Runs - {play["hr"]},
-                Team - {play["batteam"]},
-            Pitcher:
-                Name - {pitcher_name},
-                Pitch - {play["pitches"]},
-                Strikeouts - {play["k"]},
-                Earned Runs Allowed - {play["er"]},
-                Team - {play["pitteam"]},
-            Fielding:
-                Outs Made - {play["outs_post"] - play["outs_pre"]},
-                Errors on This Play - {play["e1"] + play["e2"] + play["e3"] + play["e4"]},
-                Double Play Turned? - {"Yes" if play["gdp"] else "No"},
-                Bases - {get_bases_state(play)},
-                Fielders - {', '.join(fielder_names)}
-        """
-        input_prompt = technical_prompt if mode == "technical" else casual_prompt
-        response = prompt_gemini_api(input_prompt)
+        batter_name, pitcher_name, fielder_names = _play_names(play)
+        if game is None:
+            game, position = play.state, play.position
+        input_prompt = prompt_engine.play_prompt(
+            mode, play, game, position, batter_name, pitcher_name, fielder_names
+        )
+        response = (generate or prompt_gemini_api)(input_prompt)
         return response or "Error generating response."
 
     except Exception as e:
@@ -474,45 +664,32 @@ def prompt_gemini_api(prompt):
     backoff_time = 5  # seconds
     endpoint_id = os.environ["ENDPOINT_ID"]
     flash_endpoint_id = os.environ["FLASH_ENDPOINT_ID"]
-    vertexai.init(project=project_id, location="us-central1")
 
     # Gemini pro 1.5 model
-    pro_model = GenerativeModel(
-        f"projects/{project_id}/locations/us-central1/endpoints/{endpoint_id}",
-    )
-            
-    flash_model = GenerativeModel(
-        f"projects/{project_id}/locations/us-central1/endpoints/{flash_endpoint_id}",
-    )
-            
+    pro_model = clients.generative_model(endpoint_id)
+    flash_model = clients.generative_model(flash_endpoint_id)
+
     generation_config = {
         "max_output_tokens": 8192,
         "temperature": 1,
         "top_p": 0.95,
     }
 
-    safety_settings = [
-        SafetySetting(
-            category=SafetySetting.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-            threshold=SafetySetting.HarmBlockThreshold.OFF,
-        ),
-        SafetySetting(
-            category=SafetySetting.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-            threshold=SafetySetting.HarmBlockThreshold.OFF,
-        ),
-    ]
+    safety_settings = clients.safety_settings()
 
     # First try with fine-tuned flash_model 
     for attempt in range(max_retries):
         try:
-            response = flash_model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                safety_settings=safety_settings
-            )
+            with instrumentation.span("gemini", model="flash"):
+                response = flash_model.generate_content(
+                    prompt,
+                    generation_config=generation_config,
+                    safety_settings=safety_settings
+                )
             return response.text
         except Exception as e:
             if "429" in str(e) and attempt < max_retries - 1:
+                instrumentation.increment("gemini_rate_limited_total", model="flash")
                 logger.warning(f"Rate limit exceeded for Flash API. Attempt {attempt + 1}. Retrying in {backoff_time} seconds.")
                 time.sleep(backoff_time)
                 continue
@@ -521,45 +698,37 @@ def prompt_gemini_api(prompt):
 
     # Fallback to fine-tuned pro_model
     try:
-        response = pro_model.generate_content(
-            prompt,
-            generation_config=generation_config,
-            safety_settings=safety_settings
-        )
+        with instrumentation.span("gemini", model="pro"):
+            response = pro_model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                safety_settings=safety_settings
+            )
         return response.text
     except Exception as e:
         logger.error(f"Both models failed. Final error from pro model: {e}")
         return None
 
-def get_bases_state(play):
-    """Helper function to return the base state from play data."""
-    bases = []
-    if play['br1_pre']:
-        bases.append("Runner on first")
-    if play['br2_pre']:
-        bases.append("Runner on second")
-    if play['br3_pre']:
-        bases.append("Runner on third")
-    return "Bases empty" if not bases else ", ".join(bases)
-
 def get_player_name(player_id):
     """Query BigQuery to get player name by ID."""
     if player_id in player_cache:
         return player_cache[player_id]
-    try:
-        player_query = f"""
-            SELECT first, last FROM `{project_name}.baseball_custom_dataset.2023-2024-players` 
-            WHERE id = '{player_id}' LIMIT 1
-        """
-        q_result = bq_client.query(player_query, job_config=bigquery.QueryJobConfig(use_query_cache=True)).to_dataframe()
-        if not q_result.empty:
-            player_name = f"{q_result['first'][0]} {q_result['last'][0]}"
-            player_cache[player_id] = player_name
-            return player_name
-        return "Unknown Player"
-    except Exception as e:
-        print(f"Error fetching player name: {e}")
-        return "Unknown Player"
+    return get_player_names([player_id]).get(player_id, "Unknown Player")
+
+def get_player_names(player_ids):
+    """Resolve several player IDs with a single batched BigQuery lookup."""
+    missing = [player_id for player_id in player_ids if player_id and player_id not in player_cache]
+    if missing:
+        try:
+            rows = queries.run_batched(clients.bigquery_client(), "player_names", player_names_query, "ids", missing)
+            for row in rows:
+                player_cache[row["id"]] = f"{row['first']} {row['last']}"
+            # Remember the IDs the players table lacks, so they are not looked up again.
+            for player_id in missing:
+                player_cache.setdefault(player_id, "Unknown Player")
+        except Exception as e:
+            print(f"Error fetching player names: {e}")
+    return {player_id: player_cache[player_id] for player_id in player_ids if player_id in player_cache}
 
 def get_predictions_from_model(project, endpoint_id, instance_dict, location="us-central1"):
     """Get predictions from regression and classification models deployed in Vertex AI."""
@@ -568,52 +737,56 @@ def get_predictions_from_model(project, endpoint_id, instance_dict, location="us
         instances = [instance]
         parameters_dict = {}
         parameters = ParseDict(parameters_dict, Value())
+        ai_client = clients.prediction_client()
         endpoint = ai_client.endpoint_path(
             project=project, location=location, endpoint=endpoint_id
         )
-        response = ai_client.predict(
-            endpoint=endpoint, instances=instances, parameters=parameters
+        response = predictor.predict(
+            endpoint_id, endpoint=endpoint, instances=instances, parameters=parameters
         )
         predictions = response.predictions
         prediction = dict(predictions[0])
         return prediction.get('value', None)
     except Exception as e:
+        instrumentation.increment("vertex_errors_total", endpoint=endpoint_id)
         logging.error(f"Error getting predictions from model: {e}")
         return None
 
+def load_game(gid):
+    """Return the plays of `gid` as a compact_game.CompactGame, from the instance's game cache when possible."""
+    return game_cache.get_or_load(gid, fetch_plays)
+
 def fetch_plays(gid):
-    plays_query = f"""
-            SELECT * FROM `{project_name}.baseball_custom_dataset.2023-2024-plays_v3`
-            WHERE gid = '{gid}'
-            ORDER BY ordered_event, inning
-        """
-    plays = bq_client.query_and_wait(query=plays_query,job_config=bigquery.QueryJobConfig(use_query_cache=True), wait_timeout=10).to_dataframe()
-        
+    plays = queries.run_query(clients.bigquery_client(), "plays", plays_query, timeout=PLAYS_TIMEOUT, gid=gid).to_dataframe()
+
     return plays
 
-def fetch_game_pbp(game_pk, play):
+def fetch_game_pbp(game_pk, play, is_top_inning=None):
     # Fetch the game play-by-play data from the Stats API
     url = f"https://statsapi.mlb.com/api/v1.1/game/{game_pk}/feed/live"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+        with instrumentation.span("statsapi", endpoint="feed"):
+            response = requests.get(url)
+            response.raise_for_status()
+            data = response.json()
         all_plays = data['liveData']['plays']['allPlays']
-        logger.info(all_plays)
-        return find_matching_play(play, all_plays)
+        logger.debug(f"Fetched {len(all_plays)} plays from the Stats API feed for game {game_pk}")
+        return find_matching_play(play, all_plays, is_top_inning)
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching game PBP data: {e}")
         return None
 
-def find_matching_play(play, pbp_data):
-    # We want to match data coming from the Retrosheet to MLB data
+def find_matching_play(play, pbp_data, is_top_inning=None):
+    # We want to match data coming from the Retrosheet to MLB data.
+    # Pass is_top_inning from the game_state.GameState when it is at hand.
+    batter_name = get_player_name(play['batter'])
+    pitcher_name = get_player_name(play['pitcher'])
+    inning = int(play['inning'])
+    if is_top_inning is None:
+        is_top_inning = play['top_bot'] == 0
     for pbp_play in pbp_data:
-        batter_name = get_player_name(play['batter'])
-        pitcher_name = get_player_name(play['pitcher'])
-        is_top_inning = True if play['top_bot'] == 0 else False
-        logger.info(f"pbp_play: {pbp_play}")
         try:
-            if (pbp_play['about']['inning'] == int(play['inning']) and
+            if (pbp_play['about']['inning'] == inning and
             pbp_play['about']['isTopInning'] == is_top_inning and
             pbp_play['matchup']['batter']['fullName'] == batter_name and
             pbp_play['matchup']['pitcher']['fullName'] == pitcher_name
@@ -623,121 +796,32 @@ def find_matching_play(play, pbp_data):
             return None
     return None
 
-def fetch_last_10_games(game_type):
-    """
-    Query the BigQuery table for the last 10 baseball games and fetches the game ID from the stats API.
-
-    Returns:
-        List of dictionaries containing gid, visteam, hometeam, and statsapi_game_pk.
-    """
+# Fills narration_store for the /games lists; defined here because it calls functions above.
+pregenerator = warehouse.Pregenerator(narration_store, narrate_game, predict_win_timeline, prompt_gemini_api)
 
-    dataset = os.environ.get("BIGQUERY_DATASET")
-    table = os.environ.get("BIGQUERY_TABLE")
-
-    current_date = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d')
-    query = f"""
-    SELECT gid, visteam, hometeam, date
-    FROM `{dataset}.{table}`
-    WHERE CAST(date AS STRING) <= '{current_date}'
-    AND gametype = '{game_type}'
-    ORDER BY date DESC
-    LIMIT 15
-    """
-    
-    query_job = bq_client.query(query, job_config=bigquery.QueryJobConfig(use_query_cache=True))
-    results = query_job.result()
-    
-    games = []
-    for row in results:    
-        bigquery_game = {"gid": row["gid"], "visteam": row["visteam"], "hometeam": row["hometeam"]}
-        api_game_pk = get_statsapi_game_pk(str(row['date']), row["visteam"], row["hometeam"])
-        games.append({**bigquery_game, "statsapi_game_pk": api_game_pk})
-    return games
-
-def get_statsapi_game_pk(game_date, team1, team2):
-    """
-    Fetches gamePk from the MLB Stats API using team names and date.
+_first_response_recorded = False
 
-    Args:
-        game_date (str): The date of the game.
-        team1 (str):  Team 1 from the big query result.
-        team2 (str): Team 2 from the big query result.
+@app.after_request
+def record_first_response(response):
+    """Record how long after import this instance served its first response."""
+    global _first_response_recorded
+    if not _first_response_recorded:
+        _first_response_recorded = True
+        elapsed_ms = (time.perf_counter() - _import_started) * 1000
+        instrumentation.gauge("startup_first_response_ms", round(elapsed_ms, 1), route=request.path)
+        logger.info(f"First response ({request.path}) served {elapsed_ms:.0f}ms after import.")
+    return response
 
-    Returns:
-        int or None: The gamePk if found, None otherwise.
-    """
-    date_str = f"{game_date[:4]}-{game_date[4:6]}-{game_date[6:]}"
-    team1_id = get_team_id(team1)
-    team2_id = get_team_id(team2)
+instrumentation.gauge("startup_import_ms", round((time.perf_counter() - _import_started) * 1000, 1))
 
-    # Extract the season from the game date
-    season = int(game_date[:4])
-
-    if not team1_id or not team2_id:
-        logger.warning(f"Team ID not found for team1: {team1}, team2: {team2}")
-        return None
-
-    url = f"https://statsapi.mlb.com/api/v1/schedule?sportId=1&season={season}&date={date_str}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status() 
-        data = response.json() 
-        if data['totalGames'] > 0:
-            for game in data['dates'][0]['games']:
-                if (game['teams']['away']['team']['id'] == team1_id and game['teams']['home']['team']['id'] == team2_id) or (game['teams']['away']['team']['id'] == team2_id and game['teams']['home']['team']['id'] == team1_id):
-                    return [ game['gamePk'],  { f"{team1}": team1_id, f"{team2}": team2_id } ]
-
-        logger.info(f"No matching game found for date: {date_str}, team1: {team1_id}: {team2_id}")
-        return None
-
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching gamePk from Stats API: {e}")
-        return None
-
-def get_team_id(team_abbrev):
-    """
-    Maps team abbreviation to team id.
-
-    Returns:
-        int or None: The teamId if found, None otherwise.
-    """
-
-    team_map = {
-        "ANA": 108,
-        "ARI": 109,
-        "BAL": 110,
-        "BOS": 111,
-        "CHN": 112,
-        "CHA": 145,
-        "CIN": 113,
-        "CLE": 114,
-        "COL": 115,
-        "DET": 116,
-        "HOU": 117,
-        "KCA": 118,
-        "LAN": 119,
-        "WAS": 120,
-        "NYN": 121, 
-        "MIN": 142,
-        "PHI": 143,
-        "ATL": 144,
-        "CHA": 145,
-        "MIA": 146,
-        "NYA": 147,
-        "MIL": 158,
-        "OAK": 133,
-        "PIT": 134,
-        "SDN": 135,
-        "SEA": 136,
-        "SFN": 137,
-        "SLN": 138,
-        "TBA": 139,
-        "TEX": 140,
-        "TOR": 141
-    }
 
-    return team_map.get(team_abbrev)
+def _shutdown(signum, frame):
+    # Cloud Run sends SIGTERM before stopping an instance; exiting through
+    # sys.exit runs the atexit hook that flushes pending replay states.
+    sys.exit(0)
 
 
 if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _shutdown)
+    sessions.start_reaper(session_registry, clients.firestore_client)
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8080)))
@@ -0,0 +1,217 @@
+import atexit
+import datetime
+import logging
+import os
+import threading
+import time
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "replay_states"
+
+# Seconds a stream may hold unwritten progress before it is flushed. Pausing,
+# finishing, disconnecting and shutdown always flush immediately, so this only
+# bounds the progress lost if an instance dies without SIGTERM. It has to be
+# longer than the play interval (20s by default) to save any writes at all.
+FLUSH_INTERVAL = float(os.environ.get("REPLAY_STATE_FLUSH_SECONDS", 120))
+
+# Firestore limit on writes per batch.
+MAX_BATCH_WRITES = 500
+
+FIELDS = ("is_paused", "current_play_index", "last_active", "gid", "mode", "interval")
+
+
+def _now():
+    return datetime.datetime.now(datetime.UTC)
+
+
+class ReplayState:
+    """Replay progress for one user. Assigning a field marks it for the next write."""
+    __slots__ = FIELDS + ("_dirty",)
+
+    def __init__(self, is_paused=False, current_play_index=0, last_active=None, gid=None, mode=None, interval=None):
+        object.__setattr__(self, "_dirty", set())
+        object.__setattr__(self, "is_paused", is_paused)
+        object.__setattr__(self, "current_play_index", current_play_index)
+        object.__setattr__(self, "last_active", last_active)
+        object.__setattr__(self, "gid", gid)
+        object.__setattr__(self, "mode", mode)
+        object.__setattr__(self, "interval", interval)
+
+    def __setattr__(self, name, value):
+        if name in FIELDS and getattr(self, name) != value:
+            self._dirty.add(name)
+        object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    @classmethod
+    def new(cls):
+        """Return the state of a user without a stored document. Every field is written on first save."""
+        state = cls(last_active=_now())
+        state._dirty.update(FIELDS)
+        return state
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def changes(self):
+        """Return the fields assigned since the last write."""
+        return {field: getattr(self, field) for field in self._dirty}
+
+    def mark_clean(self):
+        self._dirty.clear()
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+
+class FirestoreBackend:
+    """Reads and writes replay states in the replay_states collection."""
+
+    def __init__(self, client_factory, collection=COLLECTION):
+        self._client_factory = client_factory
+        self.collection = collection
+
+    def _document(self, user_id):
+        return self._client_factory().collection(self.collection).document(user_id)
+
+    def load(self, user_id, fields=None):
+        """Return the stored fields for `user_id` (all of them when `fields` is None), or None."""
+        with instrumentation.span("firestore", op="load_state"):
+            doc = self._document(user_id).get(field_paths=fields) if fields else self._document(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def write(self, updates):
+        """Merge each {user_id: changed fields} entry into its document in batched commits."""
+        client = self._client_factory()
+        items = list(updates.items())
+        for offset in range(0, len(items), MAX_BATCH_WRITES):
+            batch = client.batch()
+            for user_id, changes in items[offset:offset + MAX_BATCH_WRITES]:
+                batch.set(client.collection(self.collection).document(user_id), changes, merge=True)
+            with instrumentation.span("firestore", op="commit_states"):
+                batch.commit()
+
+
+class MemoryBackend:
+    """Dictionary-backed stand-in for FirestoreBackend, for tests and local runs."""
+
+    def __init__(self):
+        self.documents = {}
+        self.writes = 0
+        self._lock = threading.Lock()
+
+    def load(self, user_id, fields=None):
+        with self._lock:
+            data = self.documents.get(user_id)
+            if data is None:
+                return None
+            return {k: v for k, v in data.items() if not fields or k in fields}
+
+    def write(self, updates):
+        with self._lock:
+            for user_id, changes in updates.items():
+                self.documents.setdefault(user_id, {}).update(changes)
+                self.writes += 1
+
+
+class StateStore:
+    """
+    Keeps replay states in memory and writes only the fields that changed,
+    coalescing rapid progress updates into one write per FLUSH_INTERVAL.
+    """
+
+    def __init__(self, backend, flush_interval=FLUSH_INTERVAL):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._states = {}
+        self._last_flush = {}
+        self._lock = threading.RLock()
+
+    def load(self, user_id):
+        """
+        Read the stored state for `user_id`, writing any pending changes first
+        so another instance's updates are not masked by a stale cached copy.
+        """
+        self.flush(user_id)
+        data = self.backend.load(user_id)
+        state = ReplayState.from_dict(data) if data is not None else ReplayState.new()
+        with self._lock:
+            self._states[user_id] = state
+        return state
+
+    def cached(self, user_id):
+        """Return the in-memory state for `user_id`, loading it on first use."""
+        with self._lock:
+            state = self._states.get(user_id)
+        return state if state is not None else self.load(user_id)
+
+    def is_paused(self, user_id):
+        """Read just the stored pause flag, which /pause may have set on another instance."""
+        data = self.backend.load(user_id, fields=["is_paused"]) or {}
+        is_paused = data.get("is_paused", False)
+        with self._lock:
+            state = self._states.get(user_id)
+            if state is not None and is_paused:
+                object.__setattr__(state, "is_paused", True)
+        return is_paused
+
+    def save(self, user_id, state, flush=False):
+        """Record `state`, writing it now when `flush` is set or the flush interval has passed."""
+        with self._lock:
+            self._states[user_id] = state
+            due = time.monotonic() - self._last_flush.get(user_id, 0.0) >= self.flush_interval
+        if flush or due:
+            self.flush(user_id)
+
+    def flush(self, user_id=None):
+        """Write the pending changes of `user_id`, or of every user, in one batch."""
+        with self._lock:
+            user_ids = [user_id] if user_id is not None else list(self._states)
+            updates = {}
+            for uid in user_ids:
+                state = self._states.get(uid)
+                if state is not None and state.dirty:
+                    updates[uid] = state.changes()
+                    state.mark_clean()
+                self._last_flush[uid] = time.monotonic()
+        if updates:
+            try:
+                self.backend.write(updates)
+                instrumentation.increment("replay_state_writes_total", len(updates))
+            except Exception:
+                self._restore(updates)
+                raise
+
+    def _restore(self, updates):
+        # Put failed changes back so the next flush retries them.
+        with self._lock:
+            for uid, changes in updates.items():
+                state = self._states.get(uid)
+                if state is not None:
+                    state._dirty.update(changes)
+
+    def evict(self, user_id):
+        """Write and forget the state of `user_id`."""
+        self.flush(user_id)
+        with self._lock:
+            self._states.pop(user_id, None)
+            self._last_flush.pop(user_id, None)
+
+    def close(self):
+        """Write every pending change; called on shutdown."""
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Failed to flush replay states on shutdown: {e}")
+
+def create_store(client_factory):
+    """Create the Firestore-backed store and make sure it is flushed at shutdown."""
+    store = StateStore(FirestoreBackend(client_factory))
+    atexit.register(store.close)
+    return store
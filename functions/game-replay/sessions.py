@@ -0,0 +1,190 @@
+import datetime
+import itertools
+import logging
+import os
+import threading
+import time
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Streams one user may hold per kind ("replay", "pitch"). Opening another one
+# stops the user's oldest stream of that kind, which is usually orphaned.
+MAX_STREAMS_PER_USER = int(os.environ.get("REPLAY_MAX_STREAMS_PER_USER", 1))
+# Streams one instance may serve at once; further requests get a 429.
+MAX_STREAMS_PER_INSTANCE = int(os.environ.get("REPLAY_MAX_STREAMS", 40))
+# Streams that have not produced output for this long are stopped.
+IDLE_TIMEOUT = float(os.environ.get("REPLAY_IDLE_TIMEOUT_SECONDS", 600))
+# replay_states documents not active for this long are deleted by the reaper.
+STATE_TTL = datetime.timedelta(hours=float(os.environ.get("REPLAY_STATE_TTL_HOURS", 24)))
+# Seconds between reaper runs; 0 disables the background reaper.
+REAPER_INTERVAL = float(os.environ.get("REPLAY_REAPER_INTERVAL_SECONDS", 900))
+
+MAX_BATCH_WRITES = 500
+
+
+class SessionLimitError(Exception):
+    """Raised when an instance is already serving its maximum number of streams."""
+
+
+class Session:
+    """One live stream served by this instance."""
+    __slots__ = ("session_id", "user_id", "kind", "gid", "started", "last_active", "_stopped")
+
+    def __init__(self, session_id, user_id, kind, gid):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.kind = kind
+        self.gid = gid
+        self.started = time.monotonic()
+        self.last_active = self.started
+        self._stopped = threading.Event()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def stop(self):
+        self._stopped.set()
+
+    def wait(self, seconds):
+        """Sleep for `seconds`, waking early when the session is stopped. Returns True if stopped."""
+        return self._stopped.wait(seconds)
+
+
+class SessionRegistry:
+    """Tracks the streams this instance is serving and enforces the stream caps."""
+
+    def __init__(self, max_per_user=MAX_STREAMS_PER_USER, max_total=MAX_STREAMS_PER_INSTANCE):
+        self.max_per_user = max_per_user
+        self.max_total = max_total
+        self._sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def open(self, user_id, kind, gid=None):
+        """
+        Register a new stream for `user_id`.
+
+        Raises:
+            SessionLimitError: If the instance is already at its stream cap.
+        """
+        with self._lock:
+            own = sorted(
+                (s for s in self._sessions.values() if s.user_id == user_id and s.kind == kind),
+                key=lambda s: s.started,
+            )
+            superseded = own[:max(0, len(own) - self.max_per_user + 1)]
+            if len(self._sessions) - len(superseded) >= self.max_total:
+                instrumentation.increment("sessions_rejected_total", kind=kind)
+                raise SessionLimitError(f"This instance is serving its maximum of {self.max_total} streams.")
+            for old in superseded:
+                old.stop()
+                self._sessions.pop(old.session_id, None)
+                instrumentation.increment("sessions_superseded_total", kind=kind)
+            session = Session(next(self._ids), user_id, kind, gid)
+            self._sessions[session.session_id] = session
+            count = len(self._sessions)
+        instrumentation.gauge("sessions_active", count)
+        return session
+
+    def close(self, session):
+        session.stop()
+        with self._lock:
+            self._sessions.pop(session.session_id, None)
+            count = len(self._sessions)
+        instrumentation.gauge("sessions_active", count)
+
+    def stop_user(self, user_id, kind=None):
+        """Stop every stream of `user_id` (of `kind`, when given) on this instance."""
+        with self._lock:
+            sessions = [s for s in self._sessions.values()
+                        if s.user_id == user_id and (kind is None or s.kind == kind)]
+        for session in sessions:
+            session.stop()
+        return len(sessions)
+
+    def stop_idle(self, max_idle=IDLE_TIMEOUT):
+        """Stop streams that have not produced output for `max_idle` seconds."""
+        cutoff = time.monotonic() - max_idle
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s.last_active < cutoff]
+        for session in idle:
+            logger.info(f"Stopping idle {session.kind} stream for user {session.user_id}.")
+            session.stop()
+        return len(idle)
+
+    def active(self):
+        """Return a snapshot of the live sessions."""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def stream(self, session, generator):
+        """
+        Relay `generator` for `session`. When the client disconnects, the WSGI
+        server closes this wrapper, which closes the generator and frees the session.
+        """
+        try:
+            for chunk in generator:
+                if session.stopped:
+                    break
+                yield chunk
+                session.last_active = time.monotonic()
+        finally:
+            generator.close()
+            self.close(session)
+
+
+def reap_idle_states(client, ttl=STATE_TTL, collection="replay_states", batch_size=MAX_BATCH_WRITES):
+    """
+    Delete replay_states documents whose last_active is older than `ttl`, in
+    batches of `batch_size`.
+
+    Returns:
+        int: The number of documents deleted.
+    """
+    from google.cloud.firestore_v1.base_query import FieldFilter
+
+    cutoff = datetime.datetime.now(datetime.UTC) - ttl
+    query = client.collection(collection).where(filter=FieldFilter("last_active", "<", cutoff)).limit(batch_size)
+    deleted = 0
+    while True:
+        with instrumentation.span("firestore", op="reap_query"):
+            docs = list(query.stream())
+        if not docs:
+            break
+        batch = client.batch()
+        for doc in docs:
+            batch.delete(doc.reference)
+        with instrumentation.span("firestore", op="reap_commit"):
+            batch.commit()
+        deleted += len(docs)
+        if len(docs) < batch_size:
+            break
+    instrumentation.increment("replay_states_reaped_total", deleted)
+    if deleted:
+        logger.info(f"Reaped {deleted} replay states inactive since {cutoff.isoformat()}.")
+    return deleted
+
+def start_reaper(registry, client_factory, interval=REAPER_INTERVAL):
+    """
+    Start a daemon thread that stops idle streams and reaps stale replay_states
+    documents every `interval` seconds.
+
+    Returns:
+        threading.Event: Set it to stop the reaper, or None when disabled.
+    """
+    if interval <= 0:
+        return None
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                registry.stop_idle()
+                reap_idle_states(client_factory())
+            except Exception as e:
+                logger.error(f"Replay state reaper failed: {e}")
+
+    threading.Thread(target=run, name="replay-state-reaper", daemon=True).start()
+    return stop
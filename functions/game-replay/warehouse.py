@@ -0,0 +1,227 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "narrations"
+MODES = ("casual", "technical")
+
+# Game types of the /games lists that are pre-generated.
+GAME_TYPES = tuple(t for t in os.environ.get("NARRATION_GAME_TYPES", "regular").split(",") if t)
+# Games generated at once by a pre-generation run.
+WORKERS = int(os.environ.get("NARRATION_WORKERS", 3))
+# Gemini requests per second across a pre-generation run, leaving quota for live streams.
+GEMINI_RATE = float(os.environ.get("NARRATION_GEMINI_RATE", 2))
+# Start a background run when /games returns games that have not been seen yet.
+PREGENERATE_ON_CHANGE = os.environ.get("NARRATION_PREGENERATE", "1") == "1"
+# Seconds a game whose run failed or came out degraded is left out of the runs
+# /games starts; /pregenerate retries it at once.
+RETRY_COOLDOWN = float(os.environ.get("NARRATION_RETRY_COOLDOWN_SECONDS", 900))
+
+
+def _game_pk(game):
+    # /games reports statsapi_game_pk as [gamePk, {team: team id}].
+    game_pk = game.get("statsapi_game_pk")
+    return game_pk[0] if isinstance(game_pk, (list, tuple)) else game_pk
+
+def _plain(value):
+    # NumPy scalars from the plays DataFrame.
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+class RateLimiter:
+    """Token bucket shared by the threads of a pre-generation run."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def wrap(self, function):
+        """Return `function` rate limited by this bucket."""
+        def limited(*args, **kwargs):
+            self.acquire()
+            return function(*args, **kwargs)
+        return limited
+
+
+class NarrationStore:
+    """
+    Pre-generated play narration and win-probability timelines, one document
+    per game and mode in the narrations collection. Documents never change
+    once written, so reads are cached for the life of the instance.
+    """
+
+    def __init__(self, client_factory, collection=COLLECTION):
+        self._client_factory = client_factory
+        self.collection = collection
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+        try:
+            with instrumentation.span("firestore", op="load_narration"):
+                doc = self._client_factory().collection(self.collection).document(key).get()
+        except Exception as e:
+            logger.warning(f"Could not read pre-generated narration {key}: {e}")
+            return None
+        data = doc.to_dict() if doc.exists else None
+        if data is not None:
+            with self._lock:
+                self._cache[key] = data
+        instrumentation.increment("narration_store_reads_total", result="hit" if data else "miss")
+        return data
+
+    def _put(self, key, data):
+        data = {**data, "generated_at": datetime.datetime.now(datetime.UTC)}
+        with instrumentation.span("firestore", op="store_narration"):
+            self._client_factory().collection(self.collection).document(key).set(data)
+        with self._lock:
+            self._cache[key] = data
+
+    def narration(self, gid, mode):
+        """Return the stored descriptions of every play of `gid` in `mode`, or None."""
+        data = self._get(f"{gid}_{mode}")
+        return data["descriptions"] if data else None
+
+    def put_narration(self, gid, mode, descriptions):
+        self._put(f"{gid}_{mode}", {"gid": gid, "mode": mode, "descriptions": list(descriptions)})
+
+    def timeline(self, gid):
+        """Return the stored /predict-win predictions for `gid`, or None."""
+        data = self._get(f"{gid}_win")
+        return json.loads(data["predictions"]) if data else None
+
+    def put_timeline(self, gid, predictions):
+        # Stored as JSON: the predictions hold NumPy scalars and nested key plays.
+        self._put(f"{gid}_win", {"gid": gid, "predictions": json.dumps(predictions, default=_plain)})
+
+
+class Pregenerator:
+    """
+    Generates narration in both modes and the win-probability timeline, with
+    its key-play labels and explanations, for the games on the /games lists.
+
+    Args:
+        store: The NarrationStore to fill.
+        narrate_game: Called as narrate_game(gid, mode, generate), returns one description per play.
+        predict_wins: Called as predict_wins(gid, game_pk, generate), returns the timeline
+            and whether it is complete.
+        generate: Sends a prompt to Gemini; it is rate limited to `rate` requests per second.
+        cooldown: Seconds notify skips a game after an attempt that left it incomplete.
+    """
+
+    def __init__(self, store, narrate_game, predict_wins, generate, workers=WORKERS, rate=GEMINI_RATE,
+                 cooldown=RETRY_COOLDOWN):
+        self.store = store
+        self.workers = workers
+        self._narrate_game = narrate_game
+        self._predict_wins = predict_wins
+        self._generate = RateLimiter(rate).wrap(generate)
+        self.cooldown = cooldown
+        self._seen = set()
+        # gid -> time.monotonic() of its last attempt that left it incomplete.
+        self._failed = {}
+        self._running = threading.Lock()
+
+    def _generate_game(self, game):
+        gid = game["gid"]
+        generated = 0
+        for mode in MODES:
+            if self.store.narration(gid, mode) is None:
+                with instrumentation.span("pregenerate", part="narration"):
+                    descriptions = self._narrate_game(gid, mode, self._generate)
+                if descriptions:
+                    self.store.put_narration(gid, mode, descriptions)
+                    generated += 1
+        if self.store.timeline(gid) is None:
+            with instrumentation.span("pregenerate", part="timeline"):
+                predictions, complete = self._predict_wins(gid, _game_pk(game), self._generate)
+            # A degraded timeline would be served as final forever; leave it to a later run.
+            if predictions and complete:
+                self.store.put_timeline(gid, predictions)
+                generated += 1
+            else:
+                instrumentation.increment("win_timelines_degraded_total")
+                logger.warning(f"Not storing the degraded win timeline of {gid}.")
+        return generated
+
+    def _stored(self, gid):
+        # Games missing a document are retried by the next notify.
+        return self.store.timeline(gid) is not None and all(
+            self.store.narration(gid, mode) is not None for mode in MODES)
+
+    def run(self, games):
+        """
+        Generate whatever is missing for `games`, `workers` games at a time.
+        Only one run happens at a time on an instance.
+
+        Returns:
+            dict: Counts of games and of documents generated, or None if a run was already in progress.
+        """
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            games = list({game["gid"]: game for game in games if game.get("gid")}.values())
+            started = time.perf_counter()
+            generated = failed = 0
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pregenerate") as executor:
+                futures = {executor.submit(self._generate_game, game): game["gid"] for game in games}
+                for future, gid in futures.items():
+                    try:
+                        generated += future.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Pre-generation failed for game {gid}: {e}")
+                    if self._stored(gid):
+                        self._seen.add(gid)
+                        self._failed.pop(gid, None)
+                    else:
+                        self._failed[gid] = time.monotonic()
+            instrumentation.increment("narration_documents_generated_total", generated)
+            logger.info(f"Pre-generated {generated} narration documents for {len(games)} games "
+                        f"in {time.perf_counter() - started:.1f}s ({failed} failed).")
+            return {"games": len(games), "generated": generated, "failed": failed}
+        finally:
+            self._running.release()
+
+    def _pending(self, gid):
+        failed_at = self._failed.get(gid)
+        return gid not in self._seen and (failed_at is None or time.monotonic() - failed_at >= self.cooldown)
+
+    def notify(self, games):
+        """
+        Start a background run for the games in `games` this instance has not
+        pre-generated yet, skipping those still cooling down from a failed attempt.
+        """
+        games = [game for game in games if game.get("gid") and self._pending(game["gid"])]
+        if not PREGENERATE_ON_CHANGE or not games:
+            return False
+        threading.Thread(target=self.run, args=(games,), name="pregenerate", daemon=True).start()
+        return True
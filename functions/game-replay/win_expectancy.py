@@ -0,0 +1,153 @@
+import logging
+import math
+import os
+import threading
+import numpy as np
+import game_state
+
+logger = logging.getLogger(__name__)
+
+# The home team's chance of winning from any inning, half, base-out state and
+# score, looked up from a precomputed table. The default table comes from a
+# closed-form model of the remaining runs. Fit it to real outcomes with
+# `python win_expectancy.py OUTPUT.npy`, which reads the 2023-24 plays table,
+# and point WIN_EXPECTANCY_TABLE at the file.
+
+# How _predict_wins uses the table:
+#   remote    - only the Vertex endpoint, as before.
+#   local     - only the table.
+#   fallback  - the endpoint, and the table for plays where it returns nothing.
+#   prefilter - the table, and the endpoint for plays the table finds ambiguous.
+MODES = ("remote", "local", "fallback", "prefilter")
+MODE = os.environ.get("WIN_EXPECTANCY_MODE", "fallback")
+# In prefilter mode, plays within this many points of 50% go to the endpoint.
+AMBIGUOUS_BAND = float(os.environ.get("WIN_EXPECTANCY_AMBIGUOUS_BAND", 10))
+TABLE_PATH = os.environ.get("WIN_EXPECTANCY_TABLE")
+
+INNINGS = 9  # Extra innings are looked up as the ninth.
+MAX_LEAD = 15
+LEADS = 2 * MAX_LEAD + 1
+BASE_OUT_STATES = len(game_state.RUN_EXPECTANCY)
+
+# Runs scored per half-inning: the mean matches RUN_EXPECTANCY from the
+# start of an inning, the variance is close to recent league seasons.
+HALF_INNING_RUNS = float(game_state.RUN_EXPECTANCY[0])
+HALF_INNING_VARIANCE = 1.0
+
+_table = None
+_lock = threading.Lock()
+
+
+def state_index(inning, top, base_out, home_lead):
+    """Index the table by inning, half, base-out code and the home team's lead before the play."""
+    inning = np.clip(np.asarray(inning, dtype=np.int32), 1, INNINGS) - 1
+    half = np.where(top, 0, 1)
+    lead = np.clip(np.asarray(home_lead, dtype=np.int32), -MAX_LEAD, MAX_LEAD) + MAX_LEAD
+    return ((inning * 2 + half) * BASE_OUT_STATES + base_out) * LEADS + lead
+
+def prior_table():
+    """
+    Model the final margin as normally distributed: the current lead plus the
+    expected runs of the current half-inning and of every remaining one.
+    Ties go to extra innings, which either team wins half of the time.
+
+    Returns:
+        np.ndarray: Home win probabilities in percent, indexed by state_index.
+    """
+    inning, top, base_out, lead = np.meshgrid(
+        np.arange(1, INNINGS + 1), (True, False), np.arange(BASE_OUT_STATES), np.arange(-MAX_LEAD, MAX_LEAD + 1),
+        indexing="ij",
+    )
+    # Half-innings left after the current one.
+    away_left = INNINGS - inning
+    home_left = INNINGS - inning + top
+    current = game_state.RUN_EXPECTANCY[base_out].astype(np.float64)
+    margin = lead + (home_left - away_left) * HALF_INNING_RUNS + np.where(top, -current, current)
+    sigma = np.sqrt((home_left + away_left) * HALF_INNING_VARIANCE + HALF_INNING_VARIANCE * current / HALF_INNING_RUNS)
+    win = 0.5 * (_normal_cdf((margin - 0.5) / sigma) + _normal_cdf((margin + 0.5) / sigma))
+    # meshgrid in "ij" order matches the state_index layout.
+    return (100.0 * win).astype(np.float32).ravel()
+
+_erf = np.vectorize(math.erf, otypes=[np.float64])
+
+def _normal_cdf(z):
+    return 0.5 * (1.0 + _erf(z / math.sqrt(2.0)))
+
+def table():
+    """Return the win expectancy table, loading or computing it on first use."""
+    global _table
+    if _table is None:
+        with _lock:
+            if _table is None:
+                if TABLE_PATH:
+                    _table = np.load(TABLE_PATH).astype(np.float32)
+                    logger.info(f"Loaded win expectancy table from {TABLE_PATH}")
+                else:
+                    _table = prior_table()
+    return _table
+
+def home_win_probability(game):
+    """
+    Score every play of a game at once.
+
+    Args:
+        game: The game_state.GameState of the game.
+
+    Returns:
+        np.ndarray: The home team's win probability in percent after each play.
+    """
+    if not len(game):
+        return np.zeros(0, dtype=np.float32)
+    before = table()[state_index(game.inning, game.top, game.base_out, game.home_lead)]
+    # The state after a play is the state before the next one; after the last
+    # play the game is decided.
+    final_home, final_away = game.score(len(game) - 1)
+    final = 100.0 if final_home > final_away else 0.0 if final_home < final_away else 50.0
+    return np.append(before[1:], np.float32(final))
+
+def ambiguous(probabilities, band=AMBIGUOUS_BAND):
+    """Flag the plays whose local probability is too close to a coin flip to skip the endpoint."""
+    return np.abs(np.asarray(probabilities) - 50.0) < band
+
+def calibrate(games, prior_weight=50):
+    """
+    Fit the table to real outcomes: the share of games won from each state,
+    shrunk towards prior_table() by `prior_weight` pseudo-games.
+
+    Args:
+        games: Iterable of fetch_plays DataFrames, one per completed game.
+
+    Returns:
+        np.ndarray: The calibrated table.
+    """
+    prior = prior_table()
+    seen = np.zeros_like(prior, dtype=np.float64)
+    won = np.zeros_like(prior, dtype=np.float64)
+    for plays in games:
+        game = game_state.GameState(plays)
+        if not len(game):
+            continue
+        index = state_index(game.inning, game.top, game.base_out, game.home_lead)
+        final_home, final_away = game.score(len(game) - 1)
+        outcome = 1.0 if final_home > final_away else 0.0 if final_home < final_away else 0.5
+        np.add.at(seen, index, 1.0)
+        np.add.at(won, index, outcome)
+    calibrated = (100.0 * won + prior * prior_weight) / (seen + prior_weight)
+    return calibrated.astype(np.float32)
+
+
+if __name__ == "__main__":
+    import sys
+    from skyline_core import clients
+    from skyline_core import queries
+
+    logging.basicConfig(level=logging.INFO)
+    output = sys.argv[1] if len(sys.argv) > 1 else "win_expectancy.npy"
+    table_name = f"{os.environ['PROJECT_NAME']}.baseball_custom_dataset.2023-2024-plays_v3"
+    plays = queries.run_query(
+        clients.bigquery_client(), "win_expectancy_plays", queries.prepare(queries.ALL_PLAYS_QUERY, table_name),
+        timeout=None, max_bytes=0,
+    ).to_dataframe()
+    calibrated = calibrate(frame for _, frame in plays.groupby("gid", sort=False))
+    np.save(output, calibrated)
+    logger.info(f"Saved a win expectancy table fitted to {plays['gid'].nunique()} games to {output}")
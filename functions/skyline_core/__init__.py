@@ -0,0 +1 @@
+"""Code shared by the Skyline services: cloud clients, queries, metrics, the team registry and the schedule resolver."""
@@ -0,0 +1,87 @@
+import os
+import threading
+
+# Cloud clients are created on first use rather than at import, so a cold start
+# only pays for the clients the first request actually needs. The heavy client
+# libraries are imported inside the factories for the same reason.
+location = "us-central1"
+
+_lock = threading.Lock()
+_clients = {}
+
+
+def _get_or_create(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def bigquery_client():
+    """Return the shared BigQuery client."""
+    def create():
+        from google.cloud import bigquery
+        return bigquery.Client()
+    return _get_or_create("bigquery", create)
+
+def firestore_client():
+    """Return the shared Firestore client for DEFAULT_DATABASE."""
+    def create():
+        from google.cloud import firestore
+        return firestore.Client(database=os.environ["DEFAULT_DATABASE"])
+    return _get_or_create("firestore", create)
+
+def prediction_client():
+    """Return the shared Vertex AI prediction client."""
+    def create():
+        from google.cloud.aiplatform_v1 import PredictionServiceClient
+        return PredictionServiceClient(client_options={"api_endpoint": f"{location}-aiplatform.googleapis.com"})
+    return _get_or_create("prediction", create)
+
+def generative_model(endpoint_id):
+    """Return the Gemini model served from the given tuned endpoint."""
+    name = f"gemini:{endpoint_id}"
+    model = _clients.get(name)
+    if model is not None:
+        return model
+    # Initialise the SDK before creating the model: factories run while _lock
+    # is held, and the lock is not reentrant.
+    _get_or_create("vertexai", _init_vertexai)
+    def create():
+        from vertexai.generative_models import GenerativeModel
+        project_id = os.environ["PROJECT_ID"]
+        return GenerativeModel(f"projects/{project_id}/locations/{location}/endpoints/{endpoint_id}")
+    return _get_or_create(name, create)
+
+def safety_settings():
+    """Return the safety settings shared by every Gemini call."""
+    def create():
+        from vertexai.generative_models import SafetySetting
+        return [
+            SafetySetting(
+                category=SafetySetting.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                threshold=SafetySetting.HarmBlockThreshold.OFF,
+            ),
+            SafetySetting(
+                category=SafetySetting.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                threshold=SafetySetting.HarmBlockThreshold.OFF,
+            ),
+        ]
+    return _get_or_create("safety_settings", create)
+
+def _init_vertexai():
+    import vertexai
+    vertexai.init(project=os.environ["PROJECT_ID"], location=location)
+    return True
+
+def override(name, client):
+    """Install `client` under `name` (e.g. "bigquery" or "gemini:<endpoint>") instead of creating one."""
+    with _lock:
+        _clients[name] = client
+
+def reset():
+    """Drop every cached client."""
+    with _lock:
+        _clients.clear()
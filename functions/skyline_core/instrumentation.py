@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+
+# Set METRICS_ENABLED=false to turn every span and counter into a no-op.
+ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# Histogram bucket upper bounds, in milliseconds.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+METRIC_PREFIX = "skyline"
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS_MS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+class _Span:
+    __slots__ = ("key", "start")
+
+    def __init__(self, key):
+        self.key = key
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.key, (time.perf_counter() - self.start) * 1000)
+        if exc_type is not None:
+            name, labels = self.key
+            _increment(("span_errors_total", (("span", name),) + labels), 1)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+def span(name, **labels):
+    """
+    Time a block of code into the latency histogram for `name`.
+
+    Usage:
+        with span("bigquery", query="plays"):
+            ...
+    """
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _Span(_key(name, labels))
+
+def timed(name, **labels):
+    """Decorator form of span()."""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+def observe(key, value_ms):
+    """Record a latency observation for an already built (name, labels) key."""
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(value_ms)
+
+def increment(name, value=1, **labels):
+    """Add `value` to the counter `name`."""
+    if not ENABLED:
+        return
+    _increment(_key(name, labels), value)
+
+def gauge(name, value, **labels):
+    """Set the gauge `name` to `value`."""
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+def _increment(key, value):
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render():
+    """Render every histogram and counter in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: (list(h.counts), h.total, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines = []
+    seen = set()
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        metric = f"{METRIC_PREFIX}_{name}_duration_ms"
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS_MS, counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total:.3f}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+    for (name, labels), value in sorted(counters.items()):
+        metric = f"{METRIC_PREFIX}_{name}"
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        metric = f"{METRIC_PREFIX}_{name}"
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} gauge")
+            seen.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Drop every recorded metric."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
@@ -0,0 +1,125 @@
+import logging
+import os
+import time
+from skyline_core import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Query templates use named parameters so the query text stays identical across
+# requests. BigQuery can then serve repeats from its result cache and nothing
+# from the request is ever spliced into the SQL.
+PLAYS_QUERY = """
+    SELECT * FROM `{table}`
+    WHERE gid = @gid
+    ORDER BY ordered_event, inning
+"""
+
+# Every play of the table, with just the columns game_state.GameState needs
+# for win expectancy; used to fit the local win expectancy table.
+ALL_PLAYS_QUERY = """
+    SELECT gid, inning, top_bot, vis_home, outs_pre, outs_post, br1_pre, br2_pre, br3_pre, runs
+    FROM `{table}`
+    ORDER BY gid, ordered_event, inning
+"""
+
+PLAYER_NAMES_QUERY = """
+    SELECT id, first, last FROM `{table}`
+    WHERE id IN UNNEST(@ids)
+"""
+
+RECENT_GAMES_QUERY = """
+    SELECT gid, visteam, hometeam, date
+    FROM `{table}`
+    WHERE CAST(date AS STRING) <= @current_date
+    AND gametype = @game_type
+    ORDER BY date DESC
+    LIMIT 15
+"""
+
+# Largest number of keys bound to a single UNNEST(@ids) lookup.
+BATCH_SIZE = 500
+# Seconds a request waits for a query's results before giving up on it.
+TIMEOUT = float(os.environ.get("BIGQUERY_TIMEOUT_SECONDS", 10))
+# When set, every query is dry-run first and refused if it would process more
+# than this many bytes, e.g. after a schema change drops the gid clustering.
+# 0 skips the check and its extra round trip.
+MAX_BYTES = int(os.environ.get("BIGQUERY_MAX_BYTES", 0))
+
+_PARAM_TYPES = {bool: "BOOL", int: "INT64", float: "FLOAT64", str: "STRING"}
+
+
+class QueryTooLargeError(Exception):
+    """Raised when a query's dry run reports more than MAX_BYTES to process."""
+
+
+def prepare(template, table):
+    """Bind a query template to its fully qualified table name."""
+    return template.format(table=table)
+
+def query_parameter(name, value):
+    """Build a BigQuery query parameter, inferring its type from the Python value."""
+    from google.cloud import bigquery
+    if isinstance(value, (list, tuple, set)):
+        values = list(value)
+        param_type = _PARAM_TYPES.get(type(values[0]), "STRING") if values else "STRING"
+        return bigquery.ArrayQueryParameter(name, param_type, values)
+    return bigquery.ScalarQueryParameter(name, _PARAM_TYPES.get(type(value), "STRING"), value)
+
+def job_config(dry_run=False, **params):
+    """Return the shared job config used by every query, with the given parameters bound."""
+    from google.cloud import bigquery
+    return bigquery.QueryJobConfig(
+        use_query_cache=not dry_run,
+        dry_run=dry_run,
+        query_parameters=[query_parameter(name, value) for name, value in params.items()],
+    )
+
+def estimate_bytes(client, sql, **params):
+    """Dry-run a query and return the number of bytes it would process."""
+    job = client.query(sql, job_config=job_config(dry_run=True, **params))
+    return job.total_bytes_processed or 0
+
+def run_query(client, name, sql, timeout=TIMEOUT, max_bytes=MAX_BYTES, **params):
+    """
+    Run a parameterized query and record its timing and billing under `name`.
+    Pass timeout=None to wait for the results indefinitely.
+
+    Returns:
+        RowIterator: The query results.
+
+    Raises:
+        QueryTooLargeError: If max_bytes is set and the dry run reports more.
+    """
+    if max_bytes:
+        estimated = estimate_bytes(client, sql, **params)
+        instrumentation.increment("bigquery_bytes_estimated_total", estimated, query=name)
+        if estimated > max_bytes:
+            instrumentation.increment("bigquery_queries_refused_total", query=name)
+            raise QueryTooLargeError(f"Query {name} would process {estimated} bytes, over the {max_bytes} byte limit")
+    start = time.perf_counter()
+    with instrumentation.span("bigquery", query=name):
+        job = client.query(sql, job_config=job_config(**params))
+        rows = job.result(timeout=timeout)
+    _record(name, (time.perf_counter() - start) * 1000, job)
+    return rows
+
+def run_batched(client, name, sql, key, values, timeout=TIMEOUT, **params):
+    """
+    Run a multi-key lookup, binding `values` to the array parameter `key` in
+    chunks of BATCH_SIZE so a whole batch costs one job instead of one per key.
+
+    Returns:
+        list: The rows of every chunk, concatenated.
+    """
+    values = list(dict.fromkeys(v for v in values if v))
+    rows = []
+    for offset in range(0, len(values), BATCH_SIZE):
+        chunk = values[offset:offset + BATCH_SIZE]
+        rows.extend(run_query(client, name, sql, timeout=timeout, **{key: chunk}, **params))
+    return rows
+
+def _record(name, elapsed_ms, job):
+    bytes_billed = job.total_bytes_billed or 0
+    instrumentation.increment("bigquery_queries_total", query=name, cache="hit" if job.cache_hit else "miss")
+    instrumentation.increment("bigquery_bytes_billed_total", bytes_billed, query=name)
+    logger.debug(f"Query {name} took {elapsed_ms:.1f}ms, billed {bytes_billed} bytes (cache hit: {job.cache_hit})")
@@ -0,0 +1,140 @@
+import collections
+import gzip
+import hashlib
+import json
+import os
+import threading
+from flask import Response, request
+from skyline_core import instrumentation
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder.
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Pinned in the service images; br is skipped where it is missing.
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the headers would eat the saving.
+MIN_COMPRESS_BYTES = int(os.environ.get("RESPONSE_MIN_COMPRESS_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("RESPONSE_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("RESPONSE_BROTLI_QUALITY", 5))
+# Compressed bodies kept per instance, keyed by ETag and encoding, so a
+# popular historical game is compressed once.
+ENCODED_CACHE_SIZE = int(os.environ.get("RESPONSE_ENCODED_CACHE_SIZE", 256))
+
+_encoded = collections.OrderedDict()
+_encoded_lock = threading.Lock()
+
+
+def dumps(payload):
+    """Serialize `payload` to compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+def etag(body, encoding=None):
+    """
+    Return a strong ETag for a response body. Each content coding is a
+    different representation, so it gets its own tag.
+    """
+    digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+def _not_modified(tag):
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored and "*" matches any tag.
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or tag in candidates
+
+def _accepted_encodings():
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, *params = part.strip().split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def _negotiate(accepted):
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _encoded_body(body, tag, encoding):
+    key = (tag, encoding)
+    with _encoded_lock:
+        cached = _encoded.get(key)
+        if cached is not None:
+            _encoded.move_to_end(key)
+            return cached
+    compressed = _compress(body, encoding)
+    with _encoded_lock:
+        _encoded[key] = compressed
+        while len(_encoded) > ENCODED_CACHE_SIZE:
+            _encoded.popitem(last=False)
+    return compressed
+
+def json_response(payload, status=200, max_age=None, immutable=False, route=None):
+    """
+    Build a compact JSON response for the current request, compressed with
+    brotli or gzip when the client accepts it. Successful responses carry an
+    ETag and answer a matching If-None-Match with 304 Not Modified.
+
+    Args:
+        payload: The JSON-serializable body.
+        status (int): The HTTP status.
+        max_age (int): Seconds clients and CDNs may reuse the response without revalidating.
+        immutable (bool): Whether the body never changes, as for a finished game.
+        route (str): Label for the response size metrics.
+
+    Returns:
+        Response: The Flask response.
+    """
+    body = dumps(payload)
+    response = Response(mimetype="application/json", status=status)
+    response.headers["Vary"] = "Accept-Encoding"
+    encoding = _negotiate(_accepted_encodings()) if len(body) >= MIN_COMPRESS_BYTES else None
+
+    tag = None
+    if status == 200:
+        tag = etag(body)
+        response.headers["ETag"] = etag(body, encoding) if encoding else tag
+        if immutable:
+            response.headers["Cache-Control"] = f"public, max-age={max_age or 86400}, immutable"
+        elif max_age is not None:
+            response.headers["Cache-Control"] = f"public, max-age={max_age}"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        if _not_modified(response.headers["ETag"]):
+            response.status_code = 304
+            instrumentation.increment("response_not_modified_total", route=route or request.path)
+            return response
+
+    if encoding is not None:
+        encoded = _encoded_body(body, tag, encoding) if tag else _compress(body, encoding)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        encoded = body
+    response.set_data(encoded)
+    instrumentation.increment("response_bytes_total", len(encoded), route=route or request.path,
+                              encoding=encoding or "identity")
+    return response
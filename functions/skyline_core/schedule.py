@@ -0,0 +1,143 @@
+import collections
+import datetime
+import logging
+import os
+import threading
+import time
+import requests
+from skyline_core import instrumentation
+from skyline_core import queries
+from skyline_core import teams
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_URL = "https://statsapi.mlb.com/api/v1/schedule"
+# Seconds a Stats API schedule request may take.
+STATSAPI_TIMEOUT = float(os.environ.get("STATSAPI_TIMEOUT_SECONDS", 10))
+# Seconds the /games lists are served from memory before BigQuery is asked again.
+RECENT_GAMES_TTL = float(os.environ.get("RECENT_GAMES_TTL_SECONDS", 60))
+# Schedules of past days no longer change and are kept until evicted; today's
+# is refetched after TODAY_TTL seconds.
+TODAY_TTL = float(os.environ.get("SCHEDULE_TODAY_TTL_SECONDS", 60))
+MAX_DATES = 512
+
+
+class ScheduleResolver:
+    """
+    Lists the most recent games of the plays table and matches each one to its
+    Stats API gamePk. Both lookups are cached in memory, so the services (or a
+    single deployment hosting both) hit BigQuery once per game type and minute
+    and the Stats API once per date.
+
+    Args:
+        client_factory: Returns the BigQuery client.
+        table: The plays table as "dataset.table"; defaults to BIGQUERY_DATASET.BIGQUERY_TABLE.
+    """
+
+    def __init__(self, client_factory, table=None, ttl=RECENT_GAMES_TTL):
+        self._client_factory = client_factory
+        self._table = table
+        self.ttl = ttl
+        self._recent = {}
+        self._schedules = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def fetch_last_10_games(self, game_type):
+        """
+        Query the BigQuery table for the last 10 baseball games and fetches the game ID from the stats API.
+
+        Returns:
+            List of dictionaries containing gid, visteam, hometeam, and statsapi_game_pk.
+        """
+        with self._lock:
+            cached = self._recent.get(game_type)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            instrumentation.increment("schedule_cache_lookups_total", cache="recent_games", result="hit")
+            return [dict(game) for game in cached[1]]
+        instrumentation.increment("schedule_cache_lookups_total", cache="recent_games", result="miss")
+
+        table = self._table or f"{os.environ.get('BIGQUERY_DATASET')}.{os.environ.get('BIGQUERY_TABLE')}"
+        current_date = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%d')
+        query = queries.prepare(queries.RECENT_GAMES_QUERY, table)
+        results = queries.run_query(self._client_factory(), "recent_games", query, current_date=current_date, game_type=game_type)
+
+        games = []
+        for row in results:
+            bigquery_game = {"gid": row["gid"], "visteam": row["visteam"], "hometeam": row["hometeam"]}
+            api_game_pk = self.get_statsapi_game_pk(str(row['date']), row["visteam"], row["hometeam"])
+            games.append({**bigquery_game, "statsapi_game_pk": api_game_pk})
+        with self._lock:
+            self._recent[game_type] = (time.monotonic(), games)
+        return [dict(game) for game in games]
+
+    def get_statsapi_game_pk(self, game_date, team1, team2):
+        """
+        Fetches gamePk from the MLB Stats API using team names and date.
+
+        Args:
+            game_date (str): The date of the game.
+            team1 (str):  Team 1 from the big query result.
+            team2 (str): Team 2 from the big query result.
+
+        Returns:
+            list or None: [gamePk, {team1: team1_id, team2: team2_id}] if found, None otherwise.
+        """
+        team1_id = teams.get_team_id(team1)
+        team2_id = teams.get_team_id(team2)
+        if not team1_id or not team2_id:
+            logger.warning(f"Team ID not found for team1: {team1}, team2: {team2}")
+            return None
+
+        date_str = f"{game_date[:4]}-{game_date[4:6]}-{game_date[6:]}"
+        games = self.games_on(date_str)
+        if games is None:
+            return None
+        game_pk = games.get(frozenset((team1_id, team2_id)))
+        if game_pk is None:
+            logger.info(f"No matching game found for date: {date_str}, team1: {team1_id}: {team2_id}")
+            return None
+        return [game_pk, {f"{team1}": team1_id, f"{team2}": team2_id}]
+
+    def games_on(self, date_str):
+        """
+        Return the gamePk of every game on a date, keyed by the frozenset of
+        its two team ids, or None if the schedule could not be fetched.
+        """
+        today = datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%d')
+        with self._lock:
+            cached = self._schedules.get(date_str)
+            if cached is not None:
+                self._schedules.move_to_end(date_str)
+        if cached is not None and (date_str < today or time.monotonic() - cached[0] < TODAY_TTL):
+            instrumentation.increment("schedule_cache_lookups_total", cache="schedule", result="hit")
+            return cached[1]
+        instrumentation.increment("schedule_cache_lookups_total", cache="schedule", result="miss")
+
+        url = f"{SCHEDULE_URL}?sportId=1&season={date_str[:4]}&date={date_str}"
+        try:
+            with instrumentation.span("statsapi", endpoint="schedule"):
+                response = requests.get(url, timeout=STATSAPI_TIMEOUT)
+                response.raise_for_status()
+                data = response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching gamePk from Stats API: {e}")
+            return None
+
+        games = {}
+        for day in data.get('dates', []):
+            for game in day['games']:
+                pair = frozenset((game['teams']['away']['team']['id'], game['teams']['home']['team']['id']))
+                # Keep the first game of a doubleheader, as the linear search did.
+                games.setdefault(pair, game['gamePk'])
+        with self._lock:
+            self._schedules[date_str] = (time.monotonic(), games)
+            self._schedules.move_to_end(date_str)
+            while len(self._schedules) > MAX_DATES:
+                self._schedules.popitem(last=False)
+        return games
+
+    def clear(self):
+        """Drop every cached list and schedule."""
+        with self._lock:
+            self._recent.clear()
+            self._schedules.clear()
@@ -0,0 +1,63 @@
+# Every MLB team as (Stats API team id, league, Retrosheet abbreviations).
+# The first abbreviation is the current one; later ones are older codes that
+# still appear in the plays tables, e.g. OAK before the Athletics became ATH.
+TEAMS = (
+    (108, "AL", ("ANA",)),
+    (109, "NL", ("ARI",)),
+    (110, "AL", ("BAL",)),
+    (111, "AL", ("BOS",)),
+    (112, "NL", ("CHN",)),
+    (113, "NL", ("CIN",)),
+    (114, "AL", ("CLE",)),
+    (115, "NL", ("COL",)),
+    (116, "AL", ("DET",)),
+    (117, "AL", ("HOU",)),
+    (118, "AL", ("KCA",)),
+    (119, "NL", ("LAN",)),
+    (120, "NL", ("WAS",)),
+    (121, "NL", ("NYN",)),
+    (133, "AL", ("ATH", "OAK")),
+    (134, "NL", ("PIT",)),
+    (135, "NL", ("SDN",)),
+    (136, "AL", ("SEA",)),
+    (137, "NL", ("SFN",)),
+    (138, "NL", ("SLN",)),
+    (139, "AL", ("TBA",)),
+    (140, "AL", ("TEX",)),
+    (141, "AL", ("TOR",)),
+    (142, "AL", ("MIN",)),
+    (143, "NL", ("PHI",)),
+    (144, "NL", ("ATL",)),
+    (145, "AL", ("CHA",)),
+    (146, "NL", ("MIA",)),
+    (147, "AL", ("NYA",)),
+    (158, "NL", ("MIL",)),
+)
+
+# Built once at import and indexed both ways.
+ID_BY_ABBREV = {abbrev: team_id for team_id, _, abbrevs in TEAMS for abbrev in abbrevs}
+ABBREV_BY_ID = {team_id: abbrevs[0] for team_id, _, abbrevs in TEAMS}
+LEAGUE_BY_ID = {team_id: league for team_id, league, _ in TEAMS}
+
+
+def get_team_id(team_abbrev):
+    """
+    Maps team abbreviation to team id.
+
+    Returns:
+        int or None: The teamId if found, None otherwise.
+    """
+    return ID_BY_ABBREV.get(team_abbrev)
+
+def get_team_abbrev(team_id):
+    """
+    Maps team id to its current abbreviation.
+
+    Returns:
+        str or None: The abbreviation if found, None otherwise.
+    """
+    return ABBREV_BY_ID.get(team_id)
+
+def get_league(team_id):
+    """Return "AL" or "NL" for a team id, or None if it is unknown."""
+    return LEAGUE_BY_ID.get(team_id)
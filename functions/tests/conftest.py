@@ -0,0 +1,9 @@
+import os
+import sys
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# skyline_core lives in functions/, the replay modules in functions/game-replay.
+for path in (os.path.join(FUNCTIONS_DIR, "game-replay"), FUNCTIONS_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,65 @@
+import sys
+import threading
+import types
+import pytest
+from skyline_core import clients
+
+
+@pytest.fixture
+def fake_vertexai(monkeypatch):
+    """Install a stub vertexai package that records init and model creation."""
+    calls = []
+    vertexai = types.ModuleType("vertexai")
+    vertexai.init = lambda **kwargs: calls.append(("init", kwargs))
+    generative_models = types.ModuleType("vertexai.generative_models")
+
+    class GenerativeModel:
+        def __init__(self, name):
+            calls.append(("model", name))
+            self.name = name
+
+    generative_models.GenerativeModel = GenerativeModel
+    vertexai.generative_models = generative_models
+    monkeypatch.setitem(sys.modules, "vertexai", vertexai)
+    monkeypatch.setitem(sys.modules, "vertexai.generative_models", generative_models)
+    monkeypatch.setenv("PROJECT_ID", "test-project")
+    # A fresh cache and lock per test, so a test that deadlocks cannot block the next.
+    monkeypatch.setattr(clients, "_clients", {})
+    monkeypatch.setattr(clients, "_lock", threading.Lock())
+    return calls
+
+
+def _call_with_timeout(function, *args, timeout=5):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", function(*args)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{function.__name__} did not return within {timeout}s"
+    return result["value"]
+
+
+def test_generative_model_initialises_vertexai_without_deadlock(fake_vertexai):
+    model = _call_with_timeout(clients.generative_model, "endpoint-1")
+
+    assert model.name == "projects/test-project/locations/us-central1/endpoints/endpoint-1"
+    assert fake_vertexai == [
+        ("init", {"project": "test-project", "location": "us-central1"}),
+        ("model", model.name),
+    ]
+
+
+def test_generative_model_is_created_once_and_init_runs_once(fake_vertexai):
+    first = _call_with_timeout(clients.generative_model, "endpoint-1")
+    second = _call_with_timeout(clients.generative_model, "endpoint-1")
+    other = _call_with_timeout(clients.generative_model, "endpoint-2")
+
+    assert first is second
+    assert other is not first
+    assert [call[0] for call in fake_vertexai] == ["init", "model", "model"]
+
+
+def test_lock_is_free_after_creating_a_model(fake_vertexai):
+    _call_with_timeout(clients.generative_model, "endpoint-1")
+
+    created = _call_with_timeout(clients._get_or_create, "other", lambda: "client")
+    assert created == "client"
@@ -0,0 +1,53 @@
+import copy
+import pickle
+import numpy as np
+import pandas as pd
+import compact_game
+
+
+def _plays():
+    return pd.DataFrame({
+        "gid": ["PIT202409280"] * 4,
+        "inning": [1, 1, 2, 2],
+        "runs": pd.array([0, 3, None, 1], dtype="Int64"),
+        "outs_pre": [0, 1, 2, 0],
+        "ratio": [0.1, 0.25, np.nan, 1.0],
+        "whole": [1.0, 2.0, 3.0, 4.0],
+        "batter": ["a", None, "b", "a"],
+        "flag": [True, False, True, True],
+        "maybe": pd.array([True, None, False, True], dtype="boolean"),
+    })
+
+
+def test_plays_decode_to_the_same_feature_strings_as_the_dataframe():
+    plays = _plays()
+    game = compact_game.CompactGame(plays)
+
+    for position, row in plays.iterrows():
+        expected = {key: str(value) for key, value in row.items()}
+        assert {key: str(value) for key, value in game[position].items()} == expected
+
+
+def test_nullable_integers_are_stored_as_integers():
+    game = compact_game.CompactGame(_plays())
+
+    kind, values, _, nulls = game._columns["runs"]
+    assert kind == "int" and values.dtype == np.int8
+    assert game[2]["runs"] is pd.NA
+    assert game[1]["runs"] == 3
+
+
+def test_distinct_skips_nulls():
+    game = compact_game.CompactGame(_plays())
+
+    assert game.distinct("runs") == {0, 1, 3}
+    assert game.distinct("batter") == {"a", "b"}
+
+
+def test_play_views_copy_and_pickle():
+    game = compact_game.CompactGame(_plays())
+
+    for play in (copy.copy(game[1]), pickle.loads(pickle.dumps(game[1]))):
+        assert play.position == 1
+        assert play["runs"] == 3 and play.inning == 1
+        assert play.state.count == 4
@@ -0,0 +1,86 @@
+import json
+import re
+import pytest
+import narration
+
+
+def test_parse_batch_accepts_a_code_fenced_array():
+    text = '```json\n["Single to left.", " Strikeout swinging. "]\n```'
+
+    assert narration.parse_batch(text, 2) == ["Single to left.", "Strikeout swinging."]
+
+
+@pytest.mark.parametrize("text", [
+    '["Single to left."]',
+    '["Single to left.", "Strikeout.", "Walk."]',
+    '["Single to left.", "  "]',
+    '["Single to left.", 3]',
+    'Single to left. Strikeout.',
+    '',
+    None,
+])
+def test_parse_batch_rejects_wrong_counts_and_empty_descriptions(text):
+    assert narration.parse_batch(text, 2) is None
+
+
+class _Game:
+    """Fake play contexts, per-play narration and Gemini for a game of `count` plays."""
+
+    def __init__(self, count, broken=False):
+        self.count = count
+        self.broken = broken
+        self.batches = []
+        self.singles = []
+
+    def context_for(self, position):
+        return f"play-{position}"
+
+    def narrate_one(self, position):
+        self.singles.append(position)
+        return f"one {position}"
+
+    def generate(self, prompt):
+        positions = [int(p) for p in re.findall(r"play-(\d+)", prompt)]
+        self.batches.append(positions)
+        if self.broken:
+            return "Sorry, I can only narrate one play at a time."
+        return json.dumps([f"batch {p}" for p in positions])
+
+    def narrator(self, batch_size):
+        return narration.Narrator("casual", self.count, self.context_for, self.narrate_one, self.generate,
+                                  batch_size=batch_size)
+
+
+def _stream(narrator, start):
+    try:
+        return [narrator.get(position) for position in range(start, narrator.count)]
+    finally:
+        narrator.close()
+
+
+def test_narrator_resumes_mid_game_and_ends_on_a_partial_batch():
+    game = _Game(25)
+
+    descriptions = _stream(game.narrator(batch_size=4), 14)
+
+    assert descriptions == ["one 14"] + [f"batch {p}" for p in range(15, 25)]
+    assert game.singles == [14]
+    assert game.batches == [[15, 16, 17, 18], [19, 20, 21, 22], [23, 24]]
+
+
+def test_narrator_falls_back_to_one_call_per_play_when_a_batch_is_unparsed():
+    game = _Game(7, broken=True)
+
+    descriptions = _stream(game.narrator(batch_size=3), 0)
+
+    assert descriptions == [f"one {p}" for p in range(7)]
+    assert game.batches == [[1, 2, 3], [4, 5, 6]]
+
+
+@pytest.mark.parametrize("batch_size", [0, -1, 1])
+def test_batching_off_narrates_every_play_on_its_own(batch_size):
+    game = _Game(5)
+
+    assert _stream(game.narrator(batch_size), 0) == [f"one {p}" for p in range(5)]
+    assert narration.narrate_game("casual", 5, game.context_for, game.narrate_one, game.generate,
+                                  batch_size=batch_size) == [f"batch {p}" for p in range(5)]
@@ -0,0 +1,113 @@
+import threading
+import time
+import pytest
+import prediction_client
+
+ENDPOINT = "1234567890"
+
+
+class _Client:
+    """A PredictionServiceClient whose predict runs `behaviour(call_number)` for each call."""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def predict(self, timeout=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            number = self.calls
+        return self.behaviour(number)
+
+
+def _fail(number):
+    raise RuntimeError("endpoint unavailable")
+
+
+def _predictor(behaviour, **kwargs):
+    client = _Client(behaviour)
+    return client, prediction_client.PredictionClient(lambda: client, **kwargs)
+
+
+def test_breaker_opens_at_the_error_rate_and_then_fails_fast():
+    # Half of the first BREAKER_MIN_CALLS calls fail, the last one reaching the threshold.
+    successes = prediction_client.BREAKER_MIN_CALLS // 2
+    client, predictor = _predictor(lambda number: number <= successes or _fail(number), hedge=False)
+
+    for number in range(1, prediction_client.BREAKER_MIN_CALLS):
+        if number <= successes:
+            predictor.predict(ENDPOINT)
+        else:
+            with pytest.raises(RuntimeError):
+                predictor.predict(ENDPOINT)
+    assert not predictor.stats()[ENDPOINT]["breaker_open"]
+
+    with pytest.raises(RuntimeError):
+        predictor.predict(ENDPOINT)
+    assert predictor.stats()[ENDPOINT]["breaker_open"]
+
+    calls = client.calls
+    with pytest.raises(prediction_client.CircuitOpenError):
+        predictor.predict(ENDPOINT)
+    assert client.calls == calls
+    assert predictor.stats()[ENDPOINT]["short_circuits"] == 1
+
+
+def test_trial_call_closes_the_breaker_on_success():
+    breaker = prediction_client.CircuitBreaker(error_rate=0.5, window=4, min_calls=2, cooldown=0)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.is_open
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert not breaker.is_open and breaker.allow()
+
+
+def test_failed_trial_call_reopens_the_breaker_for_another_cooldown():
+    breaker = prediction_client.CircuitBreaker(error_rate=0.5, window=4, min_calls=2, cooldown=0.05)
+    breaker.record(False)
+    breaker.record(False)
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.is_open and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_slow_calls_raise_at_the_deadline():
+    _, predictor = _predictor(lambda number: time.sleep(1) or "late", deadline=0.05, hedge=False)
+
+    started = time.monotonic()
+    with pytest.raises(prediction_client.DeadlineExceededError):
+        predictor.predict(ENDPOINT)
+
+    assert time.monotonic() - started < 0.5
+    assert predictor.stats()[ENDPOINT]["timeouts"] == 1
+
+
+def test_hedge_wins_when_the_first_call_is_slow():
+    slow_call = prediction_client.HEDGE_MIN_SAMPLES + 1
+
+    def behaviour(number):
+        if number == slow_call:
+            time.sleep(1)
+            return "slow"
+        return "fast"
+
+    _, predictor = _predictor(behaviour, deadline=5, hedge=True)
+    for _ in range(prediction_client.HEDGE_MIN_SAMPLES):
+        assert predictor.predict(ENDPOINT) == "fast"
+
+    started = time.monotonic()
+    assert predictor.predict(ENDPOINT) == "fast"
+
+    assert time.monotonic() - started < 0.5
+    stats = predictor.stats()[ENDPOINT]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
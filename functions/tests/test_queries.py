@@ -0,0 +1,48 @@
+import pytest
+from skyline_core import queries
+
+
+class _Job:
+    def __init__(self, total_bytes):
+        self.total_bytes_processed = total_bytes
+        self.total_bytes_billed = total_bytes
+        self.cache_hit = False
+
+    def result(self, timeout=None):
+        return []
+
+
+class _Client:
+    """Records each job's dry_run flag and reports `total_bytes` for every query."""
+
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.dry_runs = []
+
+    def query(self, sql, job_config=None):
+        self.dry_runs.append(job_config.dry_run)
+        return _Job(self.total_bytes)
+
+
+def test_queries_skip_the_dry_run_without_a_byte_limit():
+    client = _Client(10 ** 12)
+
+    queries.run_query(client, "plays", "SELECT 1", max_bytes=0, gid="g")
+
+    assert client.dry_runs == [False]
+
+
+def test_queries_under_the_byte_limit_run_after_their_dry_run():
+    client = _Client(1024)
+
+    queries.run_query(client, "plays", "SELECT 1", max_bytes=4096, gid="g")
+
+    assert client.dry_runs == [True, False]
+
+
+def test_queries_over_the_byte_limit_are_refused():
+    client = _Client(8192)
+
+    with pytest.raises(queries.QueryTooLargeError):
+        queries.run_query(client, "plays", "SELECT 1", max_bytes=4096, gid="g")
+    assert client.dry_runs == [True]
@@ -0,0 +1,100 @@
+import pytest
+import replay_state
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(replay_state.time, "monotonic", clock)
+    return clock
+
+
+def test_assigning_the_same_value_does_not_mark_a_field():
+    state = replay_state.ReplayState(gid="PIT202409280", current_play_index=3)
+    state.gid = "PIT202409280"
+    state.current_play_index = 4
+
+    assert state.changes() == {"current_play_index": 4}
+
+
+def test_new_state_writes_every_field_then_only_changes(clock):
+    backend = replay_state.MemoryBackend()
+    store = replay_state.StateStore(backend)
+
+    state = store.load("user")
+    state.gid, state.mode, state.interval = "PIT202409280", "casual", 20
+    store.save("user", state, flush=True)
+    assert set(backend.documents["user"]) == set(replay_state.FIELDS)
+
+    state.current_play_index = 7
+    store.save("user", state, flush=True)
+
+    assert backend.writes == 2
+    # The second write merged one field into the document and kept the rest.
+    assert backend.documents["user"]["current_play_index"] == 7
+    assert backend.documents["user"]["gid"] == "PIT202409280"
+    assert not state.dirty
+
+
+def test_progress_is_coalesced_at_a_realistic_play_interval(clock):
+    backend = replay_state.MemoryBackend()
+    store = replay_state.StateStore(backend)
+    state = store.load("user")
+    store.save("user", state, flush=True)
+
+    # A 68-play game streamed at the default 20s interval, then finished.
+    for position in range(68):
+        clock.now += 20
+        state.current_play_index = position + 1
+        store.save("user", state, flush=False)
+    state.is_paused = True
+    store.save("user", state, flush=True)
+
+    progress_writes = backend.writes - 2
+    assert progress_writes == 68 * 20 // replay_state.FLUSH_INTERVAL
+    assert backend.documents["user"]["current_play_index"] == 68
+    assert backend.documents["user"]["is_paused"] is True
+
+
+def test_failed_write_keeps_changes_for_the_next_flush(clock):
+    class FailingBackend(replay_state.MemoryBackend):
+        fail = True
+
+        def write(self, updates):
+            if self.fail:
+                raise RuntimeError("unavailable")
+            super().write(updates)
+
+    backend = FailingBackend()
+    store = replay_state.StateStore(backend)
+    state = replay_state.ReplayState()
+    state.current_play_index = 5
+    with pytest.raises(RuntimeError):
+        store.save("user", state, flush=True)
+
+    backend.fail = False
+    store.flush("user")
+
+    assert backend.documents["user"] == {"current_play_index": 5}
+
+
+def test_pause_from_another_instance_reaches_the_cached_state(clock):
+    backend = replay_state.MemoryBackend()
+    store = replay_state.StateStore(backend)
+    state = store.load("user")
+    store.save("user", state, flush=True)
+
+    backend.write({"user": {"is_paused": True}})
+
+    assert store.is_paused("user") is True
+    assert store.cached("user").is_paused is True
+    # Taken from the stored document, so it is not written back.
+    assert "is_paused" not in store.cached("user").changes()
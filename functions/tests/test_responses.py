@@ -0,0 +1,60 @@
+import gzip
+import json
+import pytest
+from flask import Flask
+from skyline_core import responses
+
+PAYLOAD = {"predictions": [{"inning": i, "win_probability": 50.0 + i / 10} for i in range(200)]}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route("/timeline")
+    def timeline():
+        return responses.json_response(PAYLOAD, immutable=True)
+
+    return app.test_client()
+
+
+def test_each_content_coding_has_its_own_etag(client):
+    identity = client.get("/timeline")
+    gzipped = client.get("/timeline", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(gzipped.data)) == json.loads(identity.data) == PAYLOAD
+    assert identity.headers["ETag"] != gzipped.headers["ETag"]
+
+
+def test_brotli_is_preferred_when_installed(client):
+    pytest.importorskip("brotli")
+    response = client.get("/timeline", headers={"Accept-Encoding": "gzip, br"})
+
+    assert response.headers["Content-Encoding"] == "br"
+
+
+def test_encoding_refused_with_q_zero_is_not_used(client):
+    response = client.get("/timeline", headers={"Accept-Encoding": "br;q=0, gzip;q=0"})
+
+    assert "Content-Encoding" not in response.headers
+
+
+@pytest.mark.parametrize("if_none_match", ["{tag}", "W/{tag}", '"other", {tag}', "*"])
+def test_if_none_match_uses_weak_comparison(client, if_none_match):
+    tag = client.get("/timeline").headers["ETag"]
+
+    response = client.get("/timeline", headers={"If-None-Match": if_none_match.format(tag=tag)})
+
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == tag
+
+
+def test_tag_of_another_coding_does_not_match(client):
+    gzip_tag = client.get("/timeline", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    response = client.get("/timeline", headers={"If-None-Match": gzip_tag})
+
+    assert response.status_code == 200
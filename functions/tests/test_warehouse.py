@@ -0,0 +1,69 @@
+import types
+import pytest
+import warehouse
+
+GAMES = [{"gid": "PIT202409280", "statsapi_game_pk": [745123, {}]}]
+
+
+class _Store:
+    """An in-memory NarrationStore."""
+
+    def __init__(self):
+        self.narrations = {}
+        self.timelines = {}
+
+    def narration(self, gid, mode):
+        return self.narrations.get((gid, mode))
+
+    def put_narration(self, gid, mode, descriptions):
+        self.narrations[gid, mode] = descriptions
+
+    def timeline(self, gid):
+        return self.timelines.get(gid)
+
+    def put_timeline(self, gid, predictions):
+        self.timelines[gid] = predictions
+
+
+@pytest.fixture
+def started(monkeypatch):
+    """The runs notify starts, run in the calling thread instead."""
+    runs = []
+
+    def thread(target, args, **kwargs):
+        runs.append(args[0])
+        return types.SimpleNamespace(start=lambda: target(*args))
+
+    monkeypatch.setattr(warehouse, "PREGENERATE_ON_CHANGE", True)
+    monkeypatch.setattr(warehouse, "threading", types.SimpleNamespace(Thread=thread, Lock=warehouse.threading.Lock))
+    return runs
+
+
+def _pregenerator(store, complete, cooldown=900):
+    return warehouse.Pregenerator(
+        store, lambda gid, mode, generate: ["text"], lambda gid, game_pk, generate: ([{"play": 1}], complete[0]),
+        lambda prompt: "text", rate=0, cooldown=cooldown)
+
+
+def test_notify_skips_a_degraded_game_until_its_cooldown_ends(started):
+    complete = [False]
+    pregenerator = _pregenerator(_Store(), complete)
+
+    assert pregenerator.notify(GAMES)
+    assert not pregenerator.notify(GAMES)
+    assert len(started) == 1
+
+    complete[0] = True
+    assert pregenerator.run(GAMES) == {"games": 1, "generated": 1, "failed": 0}
+    assert not pregenerator.notify(GAMES)
+
+
+def test_notify_retries_a_failed_game_after_its_cooldown(started):
+    complete = [False]
+    pregenerator = _pregenerator(_Store(), complete, cooldown=0)
+
+    assert pregenerator.notify(GAMES)
+    complete[0] = True
+    assert pregenerator.notify(GAMES)
+    assert not pregenerator.notify(GAMES)
+    assert len(started) == 2
@@ -0,0 +1,92 @@
+import os
+import sys
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+GID = "PIT202409280"
+
+
+@pytest.fixture(scope="module")
+def replay():
+    """The replay service on the benchmark fakes, with instant, error-free backends."""
+    sys.path.insert(0, BENCHMARKS_DIR)
+    import fakes
+    import harness
+    return harness.load_replay(fakes.make_backends(latency_scale=0)).replay
+
+
+def _failing_at(replay, monkeypatch, failed_position):
+    calls = []
+    predict = replay.get_predictions_from_model
+
+    def get_predictions_from_model(*args, **kwargs):
+        calls.append(args)
+        return None if len(calls) - 1 == failed_position else predict(*args, **kwargs)
+
+    monkeypatch.setattr(replay, "get_predictions_from_model", get_predictions_from_model)
+
+
+def test_fallback_replaces_only_the_failed_play(replay, monkeypatch):
+    healthy, complete = replay.predict_win_timeline(GID, None, generate=lambda prompt: "text", mode="fallback")
+    assert complete
+
+    _failing_at(replay, monkeypatch, 10)
+    degraded, complete = replay.predict_win_timeline(GID, None, generate=lambda prompt: "text", mode="fallback")
+
+    assert not complete
+    assert len(degraded) == len(healthy)
+    local = replay.win_expectancy.home_win_probability(replay.load_game(GID).state)
+    assert degraded[10]["win_probability"] == round(float(local[10]), 1)
+    for position, (before, after) in enumerate(zip(healthy, degraded)):
+        if position != 10:
+            assert after["win_probability"] == before["win_probability"]
+
+
+def test_switching_source_is_not_a_key_play(replay, monkeypatch):
+    _failing_at(replay, monkeypatch, 10)
+    predictions, _ = replay.predict_win_timeline(GID, None, generate=lambda prompt: "text", mode="fallback")
+
+    local = replay.win_expectancy.home_win_probability(replay.load_game(GID).state)
+    for position in (10, 11):
+        key_play = predictions[position]["key_play"]
+        table_change = round(float(local[position] - local[position - 1]), 1)
+        if key_play is None:
+            assert abs(table_change) <= 5
+        else:
+            assert key_play["probability_change"] == table_change
+
+
+def test_play_description_defaults_to_the_plays_own_game(replay):
+    prompts = []
+    game = replay.load_game(GID)
+
+    text = replay.generate_play_description(game[5], "casual", generate=lambda prompt: prompts.append(prompt) or "text")
+
+    assert text == "text"
+    replay.generate_play_description(game[5], "casual", game.state, 5, generate=prompts.append)
+    assert prompts[0] == prompts[1]
+
+
+def test_unknown_players_are_looked_up_once(replay, monkeypatch):
+    lookups = []
+    run_batched = replay.queries.run_batched
+
+    def counting_run_batched(client, name, sql, key, values, **kwargs):
+        lookups.append(list(values))
+        return run_batched(client, name, sql, key, values, **kwargs)
+
+    monkeypatch.setattr(replay.queries, "run_batched", counting_run_batched)
+    monkeypatch.setattr(replay, "player_cache", {})
+
+    assert replay.get_player_name("nobody001") == "Unknown Player"
+    assert replay.get_player_names(["nobody001"]) == {"nobody001": "Unknown Player"}
+    assert replay.get_player_name("nobody001") == "Unknown Player"
+    assert lookups == [["nobody001"]]
+
+
+def test_key_play_explanations_carry_the_leverage(replay):
+    prompts = []
+    replay.predict_win_timeline(GID, None, generate=lambda prompt: prompts.append(prompt) or "text", mode="local")
+
+    leverages = [prompt.split("leverage: ")[1].split(" ")[0] for prompt in prompts if "leverage: " in prompt]
+    assert leverages and all(float(value) > 0 for value in leverages)